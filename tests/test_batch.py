@@ -0,0 +1,121 @@
+import io
+import json
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import TestCase
+
+from ziggurat import batch
+from ziggurat.__main__ import main
+from ziggurat.batch import BatchReport, render_batch
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+GREETING = str(FIXTURES_DIR / "greeting.txt")
+
+
+def ndjson(*contexts):
+    return [json.dumps(ctx) + "\n" for ctx in contexts]
+
+
+class BatchTestCases(TestCase):
+    def test_render_batch(self):
+        outputs = []
+        contexts = ndjson({"name": "A"}, {"nope": 1}, {"name": "C"})
+        report = render_batch(GREETING, contexts, lambda *out: outputs.append(out))
+
+        self.assertEqual(outputs, [(1, "Hello A!"), (3, "Hello C!")])
+        self.assertEqual(report.rendered, 2)
+        self.assertEqual(report.total, 3)
+        self.assertEqual(len(report.failures), 1)
+        self.assertEqual(report.failures[0][0], 2)
+        self.assertRegex(
+            report.failures[0][1], r"^UndefinedError: 'name' is undefined at .*:1$"
+        )
+        self.assertEqual(len(report.latencies), 3)
+        self.assertIn("rendered 2/3", report.summary())
+
+    def test_render_batch_in_parallel_keeps_order(self):
+        outputs = []
+        contexts = ndjson(*({"name": str(i)} for i in range(20)))
+        report = render_batch(
+            GREETING, contexts, lambda *out: outputs.append(out), workers=2
+        )
+
+        self.assertEqual(report.rendered, 20)
+        self.assertEqual(outputs, [(i + 1, f"Hello {i}!") for i in range(20)])
+
+    def test_percentile(self):
+        report = render_batch(GREETING, [], lambda *out: None)
+        self.assertEqual(report.percentile(50), 0.0)
+        report.latencies.extend([0.4, 0.1, 0.3, 0.2])
+        self.assertEqual(report.percentile(50), 0.2)
+        self.assertEqual(report.percentile(100), 0.4)
+
+    def test_report_memory_is_bounded(self):
+        report = BatchReport()
+        for i in range(batch.LATENCY_SAMPLE * 3):
+            report.add_latency(i)
+            report.add_failure(i, "error")
+
+        self.assertEqual(len(report.latencies), batch.LATENCY_SAMPLE)
+        self.assertEqual(len(report.failures), batch.MAX_FAILURES)
+        self.assertEqual(report.failed, batch.LATENCY_SAMPLE * 3)
+        self.assertEqual(report.total, batch.LATENCY_SAMPLE * 3)
+        # a uniform sample keeps the median close to the true one
+        self.assertAlmostEqual(
+            report.percentile(50), batch.LATENCY_SAMPLE * 1.5, delta=1000
+        )
+        self.assertIn("and 29900 more", report.summary())
+
+    def test_cli_render_to_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            contexts = Path(tmp) / "contexts.ndjson"
+            contexts.write_text("".join(ndjson({"name": "A"}, {"name": "B"})))
+            out = Path(tmp) / "out"
+
+            with redirect_stderr(io.StringIO()) as stderr:
+                status = main(
+                    ["render", GREETING, "--contexts", str(contexts), "--out", str(out)]
+                )
+
+            self.assertEqual(status, 0)
+            self.assertEqual((out / "1.txt").read_text(), "Hello A!")
+            self.assertEqual((out / "2.txt").read_text(), "Hello B!")
+            self.assertIn("latency p50=", stderr.getvalue())
+
+    def test_cli_render_to_stdout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            contexts = Path(tmp) / "contexts.ndjson"
+            contexts.write_text("".join(ndjson({"name": "A"}, {}, {"name": "\nC"})))
+
+            with redirect_stdout(io.StringIO()) as stdout, redirect_stderr(
+                io.StringIO()
+            ) as stderr:
+                status = main(["render", GREETING, "--contexts", str(contexts)])
+
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                [json.loads(line) for line in stdout.getvalue().splitlines()],
+                [
+                    {"line": 1, "output": "Hello A!"},
+                    {"line": 3, "output": "Hello \nC!"},
+                ],
+            )
+            self.assertIn("line 2: UndefinedError", stderr.getvalue())
+
+    def test_cli_missing_template(self):
+        missing = str(FIXTURES_DIR / "nope.txt")
+        for workers in ("1", "2"):
+            with redirect_stdout(io.StringIO()), redirect_stderr(
+                io.StringIO()
+            ) as stderr:
+                status = main(["render", missing, "--workers", workers])
+
+            self.assertEqual(status, 1)
+            self.assertEqual(
+                stderr.getvalue().splitlines(),
+                [
+                    f"Can't load {missing}: FileNotFoundError: "
+                    f"[Errno 2] No such file or directory: '{missing}'"
+                ],
+            )
@@ -0,0 +1,84 @@
+import io
+import json
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import TestCase
+
+from ziggurat import Environment
+from ziggurat.__main__ import main
+from ziggurat.benchmark import SampleContext, measure
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class BenchmarkTestCases(TestCase):
+    def test_sample_context(self):
+        template = Environment().get_template(FIXTURES_DIR / "nginx.conf")
+        result = template.render(SampleContext(loop_size=3))
+        self.assertEqual(result.count("proxy_pass sample;"), 3)
+        self.assertIn("server_name sample;", result)
+
+    def test_measure(self):
+        result = measure(
+            str(FIXTURES_DIR / "nginx.conf"), Environment(), loop_sizes=[1, 1000]
+        )
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["ast_nodes"], 18)
+        self.assertGreater(result["ast_bytes"], 0)
+
+        small, large = result["renders"]
+        self.assertEqual(small["loop_size"], 1)
+        self.assertGreater(large["output_chars"], small["output_chars"] * 100)
+        self.assertGreater(large["peak_bytes"], small["peak_bytes"])
+
+    def test_measure_extended_template(self):
+        env = Environment()
+        source = str(FIXTURES_DIR / "page.txt")
+        child = measure(source, env, loop_sizes=[1])
+        parent = measure(
+            str(FIXTURES_DIR / "layouts" / "base_layout.txt"), env, loop_sizes=[1]
+        )
+        # both measure the tree the template holds, its parent's with
+        # sections replaced
+        self.assertGreater(child["ast_nodes"], parent["ast_nodes"])
+        self.assertGreater(child["ast_bytes"], parent["ast_bytes"])
+
+    def test_measure_with_context(self):
+        result = measure(
+            str(FIXTURES_DIR / "greeting.txt"), Environment(), context={"name": "x"}
+        )
+        self.assertEqual(result["renders"][0]["output_chars"], 8)
+
+    def test_measure_error(self):
+        result = measure(str(FIXTURES_DIR / "nope.txt"), Environment())
+        self.assertTrue(result["error"].startswith("FileNotFoundError"))
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "memory.json"
+            status = main(
+                [
+                    "bench-memory",
+                    str(FIXTURES_DIR / "greeting.txt"),
+                    str(FIXTURES_DIR / "macros.txt"),
+                    "--loop-sizes",
+                    "5,50",
+                    "--out",
+                    str(out),
+                ]
+            )
+            self.assertEqual(status, 0)
+            report = json.loads(out.read_text())
+
+        self.assertEqual(report["loop_sizes"], [5, 50])
+        self.assertEqual(len(report["templates"]), 2)
+        self.assertEqual(
+            [r["loop_size"] for r in report["templates"][1]["renders"]], [5, 50]
+        )
+
+    def test_cli_stdout(self):
+        with redirect_stdout(io.StringIO()) as stdout:
+            main(["bench-memory", str(FIXTURES_DIR / "greeting.txt")])
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(len(report["templates"][0]["renders"]), 3)
@@ -0,0 +1,73 @@
+import io
+import shutil
+import tempfile
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import TestCase, mock
+
+from ziggurat import Environment
+from ziggurat.__main__ import main
+from ziggurat.bundle import Bundle, write_bundle
+from ziggurat.exceptions import PreloadError, TemplateError
+
+TEMPLATES = {
+    "base.txt": "<@block body@@endblock@>@include parts/footer.txt@",
+    "page.txt": "@extends base.txt@@block body@{name|upper}@endblock@",
+    "parts/footer.txt": "@include ../sign.txt@",
+    "sign.txt": "bye",
+}
+
+
+class BundleTestCases(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.root = self.tmp / "templates"
+        for name, source in TEMPLATES.items():
+            (self.root / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / name).write_text(source)
+
+    def test_bundle(self):
+        out = self.tmp / "out.zgb"
+        report = write_bundle(self.root, out, workers=1)
+        self.assertEqual(report.templates, 4)
+        self.assertEqual(report.size, out.stat().st_size)
+
+        # the templates are only read from the bundle
+        shutil.rmtree(self.root)
+        bundle = Bundle(out, root=self.root)
+        self.addCleanup(bundle.close)
+        self.assertEqual(sorted(bundle.index), sorted(TEMPLATES))
+
+        env = Environment(bundle=bundle)
+        with mock.patch.object(bundle, "load", wraps=bundle.load) as load:
+            template = env.get_template("page.txt")
+            self.assertEqual(template.render({"name": "x"}), "<X>bye")
+            self.assertEqual(load.call_count, 4)
+        self.assertIs(env.get_template(self.root / "page.txt"), template)
+
+    def test_default_root(self):
+        write_bundle(self.root, self.tmp / "templates.zgb", workers=1)
+        env = Environment(bundle=self.tmp / "templates.zgb")
+        self.addCleanup(env.bundle.close)
+        self.assertEqual(env.bundle.root, self.root.resolve())
+        self.assertEqual(env.get_template("sign.txt").render({}), "bye")
+
+    def test_errors(self):
+        (self.root / "broken.txt").write_text("@if x@")
+        with self.assertRaises(PreloadError) as ctx:
+            write_bundle(self.root, self.tmp / "out.zgb", workers=1)
+        self.assertEqual(list(ctx.exception.errors), ["broken.txt"])
+        self.assertFalse((self.tmp / "out.zgb").exists())
+
+        with self.assertRaises(TemplateError):
+            Bundle(self.root / "sign.txt")
+
+    def test_cli(self):
+        out = self.tmp / "out.zgb"
+        with redirect_stderr(io.StringIO()) as stderr:
+            status = main(["bundle", str(self.root), "--out", str(out)])
+        self.assertEqual(status, 0)
+        self.assertIn("bundled 4 templates", stderr.getvalue())
+        self.assertTrue(out.exists())
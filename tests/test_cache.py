@@ -0,0 +1,147 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock
+
+from ziggurat import Environment
+from ziggurat.cache import LRUCache, RenderCache, Uncacheable, fingerprint
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class Row:
+    def __init__(self, name):
+        self.name = name
+
+
+class FingerprintTestCases(TestCase):
+    def test_only_paths_matter(self):
+        paths = ["user.name", "items"]
+        a = fingerprint({"user": {"name": "a", "age": 1}, "items": [1]}, paths)
+        b = fingerprint({"user": {"name": "a", "age": 2}, "items": [1], "x": 1}, paths)
+        c = fingerprint({"user": {"name": "b"}, "items": [1]}, paths)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_values(self):
+        self.assertEqual(
+            fingerprint({"a": {"x": 1, "y": 2}}, ["a"]),
+            fingerprint({"a": {"y": 2, "x": 1}}, ["a"]),
+        )
+        self.assertNotEqual(
+            fingerprint({"a": 1}, ["a"]), fingerprint({"a": "1"}, ["a"])
+        )
+        self.assertNotEqual(fingerprint({}, ["a"]), fingerprint({"a": None}, ["a"]))
+        self.assertEqual(
+            fingerprint({"a": [Row("x")]}, ["a"]), fingerprint({"a": [Row("x")]}, ["a"])
+        )
+        self.assertNotEqual(
+            fingerprint({"a": [Row("x")]}, ["a"]), fingerprint({"a": [Row("y")]}, ["a"])
+        )
+
+    def test_uncacheable(self):
+        with self.assertRaises(Uncacheable):
+            fingerprint({"a": iter([1, 2])}, ["a"])
+        with self.assertRaises(Uncacheable):
+            fingerprint({"a": object()}, ["a"])
+
+
+class LRUCacheTestCases(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        self.assertEqual(cache.get("a"), "1")
+        cache.set("c", "3")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        self.assertEqual(cache.get("c"), "3")
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=10)
+        with mock.patch("ziggurat.cache.time.monotonic", return_value=100):
+            cache.set("a", "1")
+        with mock.patch("ziggurat.cache.time.monotonic", return_value=105):
+            self.assertEqual(cache.get("a"), "1")
+        with mock.patch("ziggurat.cache.time.monotonic", return_value=110):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class RenderCacheTestCases(TestCase):
+    def test_context_paths(self):
+        env = Environment()
+        self.assertEqual(
+            env.get_template(FIXTURES_DIR / "nginx.conf").context_paths(),
+            ["host", "locations", "ssl"],
+        )
+        self.assertEqual(
+            env.get_template(FIXTURES_DIR / "macros.txt").context_paths(),
+            ["some_inputs", "val"],
+        )
+        self.assertEqual(
+            env.get_template(FIXTURES_DIR / "uses_include.txt").context_paths(),
+            ["bar", "foo"],
+        )
+
+    def test_render_cache(self):
+        cache = LRUCache()
+        env = Environment(render_cache=cache)
+        template = env.get_template(FIXTURES_DIR / "uses_include.txt")
+
+        self.assertEqual(
+            template.render({"foo": 1, "bar": 2}), "Some base with foo=1\n\nand bar=2\n"
+        )
+        with mock.patch.object(template, "_render") as render:
+            self.assertEqual(
+                template.render({"foo": 1, "bar": 2, "unused": 3}),
+                "Some base with foo=1\n\nand bar=2\n",
+            )
+            render.assert_not_called()
+        self.assertEqual(
+            template.render({"foo": 1, "bar": 3}), "Some base with foo=1\n\nand bar=3\n"
+        )
+        self.assertEqual(len(cache), 2)
+
+    def test_uncacheable_renders_normally(self):
+        cache = LRUCache()
+        env = Environment(render_cache=cache)
+        template = env.get_template(FIXTURES_DIR / "nginx.conf")
+        ctx = {"ssl": False, "host": "x", "locations": iter([])}
+        self.assertIn("listen 80;", template.render(ctx))
+        self.assertEqual(len(cache), 0)
+
+    def test_environments_sharing_a_cache(self):
+        cache = LRUCache()
+        path = FIXTURES_DIR / "transformed_greeting.txt"
+        upper = Environment(
+            transforms={"custom_transform": str.upper}, render_cache=cache
+        )
+        lower = Environment(
+            transforms={"custom_transform": str.lower}, render_cache=cache
+        )
+        self.assertEqual(upper.get_template(path).render({"name": "W"}), "Hello W!")
+        self.assertEqual(lower.get_template(path).render({"name": "W"}), "Hello w!")
+        self.assertEqual(len(cache), 2)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name, source in {
+                "base/page.txt": "P:@include header.txt@",
+                "base/header.txt": "base",
+                "one/header.txt": "tenant1",
+                "two/header.txt": "tenant2",
+            }.items():
+                (root / name).parent.mkdir(parents=True, exist_ok=True)
+                (root / name).write_text(source)
+
+            base = Environment(search_path=[root / "base"], render_cache=cache)
+            one = base.overlay(root / "one", render_cache=cache)
+            two = base.overlay(root / "two", render_cache=cache)
+            self.assertEqual(one.get_template("page.txt").render({}), "P:tenant1")
+            self.assertEqual(two.get_template("page.txt").render({}), "P:tenant2")
+            self.assertEqual(base.get_template("page.txt").render({}), "P:base")
+
+    def test_backends_implement_get_and_set(self):
+        with self.assertRaises(TypeError):
+            RenderCache()  # type: ignore[abstract]
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from ziggurat import Environment
+from ziggurat.coalesce import RenderCoalescer
+from ziggurat.exceptions import CoalescedRenderError
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class SlowEnvironment(Environment):
+    """
+    Renders `transformed_greeting.txt` with a transform blocking until
+    released, which fails for names which aren't strings.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+        def slow(value):
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            return value.strip()
+
+        self.register_transform(slow, "custom_transform")
+        self.template = self.get_template(FIXTURES_DIR / "transformed_greeting.txt")
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class RenderCoalescerTestCases(TestCase):
+    def setUp(self):
+        self.env = SlowEnvironment()
+        self.coalescer = RenderCoalescer()
+
+    def test_render(self):
+        template = self.env.template
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(self.coalescer.render, template, {"name": "A"})
+            self.env.started.wait(5)
+            followers = [
+                pool.submit(self.coalescer.render, template, {"name": "A", "x": i})
+                for i in range(3)
+            ]
+            wait_for(lambda: self.coalescer.coalesced == 3)
+            self.env.release.set()
+
+            results = [f.result() for f in [leader, *followers]]
+
+        self.assertEqual(results, ["Hello A!"] * 4)
+        self.assertEqual(self.env.calls, 1)
+        self.assertEqual((self.coalescer.requests, self.coalescer.renders), (4, 1))
+        self.assertFalse(self.coalescer._calls)
+
+    def test_different_contexts_render_separately(self):
+        self.env.release.set()
+        template = self.env.template
+        self.assertEqual(self.coalescer.render(template, {"name": "A"}), "Hello A!")
+        self.assertEqual(self.coalescer.render(template, {"name": "B"}), "Hello B!")
+        self.assertEqual((self.coalescer.renders, self.coalescer.coalesced), (2, 0))
+
+    def test_errors_are_shared(self):
+        template = self.env.template
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(self.coalescer.render, template, {"name": 1})
+            self.env.started.wait(5)
+            follower = pool.submit(self.coalescer.render, template, {"name": 1})
+            wait_for(lambda: self.coalescer.coalesced == 1)
+            self.env.release.set()
+
+            with self.assertRaises(AttributeError) as leading:
+                leader.result()
+            with self.assertRaises(CoalescedRenderError) as coalesced:
+                follower.result()
+        # each waiter raises its own exception, chaining the leader's
+        self.assertIs(coalesced.exception.error, leading.exception)
+        self.assertIs(coalesced.exception.__cause__, leading.exception)
+
+
+class AsyncRenderCoalescerTestCases(IsolatedAsyncioTestCase):
+    async def test_render_async(self):
+        env = SlowEnvironment()
+        coalescer = RenderCoalescer()
+
+        tasks = [
+            asyncio.ensure_future(coalescer.render_async(env.template, {"name": "A"}))
+            for _ in range(5)
+        ]
+        while coalescer.requests < 5:
+            await asyncio.sleep(0.001)
+        env.release.set()
+
+        self.assertEqual(await asyncio.gather(*tasks), ["Hello A!"] * 5)
+        self.assertEqual(env.calls, 1)
+        self.assertEqual((coalescer.renders, coalescer.coalesced), (1, 4))
+        self.assertFalse(coalescer._futures)
+
+    async def test_render_async_errors(self):
+        env = SlowEnvironment()
+        coalescer = RenderCoalescer()
+
+        tasks = [
+            asyncio.ensure_future(coalescer.render_async(env.template, {"name": 1}))
+            for _ in range(3)
+        ]
+        while coalescer.requests < 3:
+            await asyncio.sleep(0.001)
+        env.release.set()
+
+        leader, *followers = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertIsInstance(leader, AttributeError)
+        for follower in followers:
+            self.assertIsInstance(follower, CoalescedRenderError)
+            self.assertIs(follower.error, leader)
+        self.assertIsNot(*followers)
@@ -0,0 +1,420 @@
+import gc
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase, skipUnless
+
+from ziggurat import Environment, Template, ast
+from ziggurat.cache import LRUCache
+from ziggurat.exceptions import (
+    PreloadError,
+    TemplateError,
+    UndefinedError,
+    UnknownTransformError,
+)
+from ziggurat.instrumentation import MemoryAggregator
+from ziggurat.undefined import EMPTY, Default
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class EnvironmentTestCases(TestCase):
+    def test_transforms_are_scoped_to_environment(self):
+        first = Environment()
+        second = Environment()
+        first.register_transform(lambda value: value[0], "custom_transform")
+        second.register_transform(lambda value: value[-1], "custom_transform")
+
+        path = FIXTURES_DIR / "transformed_greeting.txt"
+        self.assertEqual(first.get_template(path).render({"name": "World"}), "Hello W!")
+        self.assertEqual(
+            second.get_template(path).render({"name": "World"}), "Hello d!"
+        )
+        self.assertNotIn("custom_transform", Template.transforms)
+
+    def test_unknown_transform_fails_at_load(self):
+        env = Environment()
+        with self.assertRaises(UnknownTransformError) as ctx:
+            env.get_template(FIXTURES_DIR / "transformed_greeting.txt")
+        self.assertEqual(ctx.exception.names, ["custom_transform"])
+
+    def test_get_template_is_cached(self):
+        env = Environment()
+        path = FIXTURES_DIR / "greeting.txt"
+        self.assertIs(env.get_template(path), env.get_template(str(path)))
+
+    def test_registry_change_rebinds(self):
+        env = Environment()
+        env.register_transform(lambda value: value[0], "custom_transform")
+        template = env.get_template(FIXTURES_DIR / "transformed_greeting.txt")
+        self.assertEqual(template.render({"name": "World"}), "Hello W!")
+
+        env.register_transform(lambda value: value[1], "custom_transform")
+        self.assertEqual(template.render({"name": "World"}), "Hello o!")
+
+        lookup = next(n for n in template.ast.nodes if isinstance(n, ast.Lookup))
+        funcs = lookup.funcs
+        del env.transforms["custom_transform"]
+        with self.assertRaises(UnknownTransformError):
+            template.render({"name": "World"})
+        # the failed rebind left the tree as it was
+        self.assertIs(lookup.funcs, funcs)
+
+    def test_includes_use_environment(self):
+        env = Environment()
+        template = env.get_template(FIXTURES_DIR / "uses_include.txt")
+        template.render({"foo": "bar", "bar": "foo"})
+        self.assertIn(str((FIXTURES_DIR / "base.txt").resolve()), env.templates)
+
+    def test_autoescape(self):
+        env = Environment(autoescape=True)
+        env.register_transform(lambda value: f"<b>{value}</b>", "bold", safe=True)
+        template = env.get_template(FIXTURES_DIR / "escaped.html")
+        result = template.render(
+            {"title": '"quoted"', "body": "<script>", "html": "<i>a & b</i>"}
+        )
+        self.assertEqual(
+            result,
+            '<p title="&#34;quoted&#34;">&lt;script&gt;</p>\n'
+            "<b><i>a & b</i></b> &lt;i&gt;a &amp; b&lt;/i&gt; <b><i>a & b</i></b>\n",
+        )
+
+    def test_autoescape_per_template(self):
+        env = Environment(autoescape=True)
+        env.register_transform(lambda value: f"<b>{value}</b>", "bold")
+        template = Template(
+            str(FIXTURES_DIR / "escaped.html"), environment=env, autoescape=False
+        )
+        result = template.render({"title": "'", "body": "<br>", "html": "&"})
+        self.assertEqual(result, '<p title="\'"><br></p>\n<b>&</b> &amp; <b>&</b>\n')
+
+    def test_autoescape_per_template_applies_to_includes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "page.html").write_text("<p>{x}</p>@include inner.html@")
+            (root / "inner.html").write_text("<i>{x}</i>")
+
+            env = Environment()
+            template = Template(
+                str(root / "page.html"), environment=env, autoescape=True
+            )
+            self.assertEqual(
+                template.render({"x": "<script>"}),
+                "<p>&lt;script&gt;</p><i>&lt;script&gt;</i>",
+            )
+            # and the other way round, the included template's setting is
+            # only its own
+            self.assertEqual(
+                env.get_template(root / "page.html").render({"x": "<b>"}),
+                "<p><b></p><i><b></i>",
+            )
+
+    def write_templates(self, root: Path, templates: dict):
+        for name, source in templates.items():
+            (root / name).parent.mkdir(parents=True, exist_ok=True)
+            (root / name).write_text(source)
+
+    def test_preload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root,
+                {
+                    "base.txt": "<@block body@@endblock@>",
+                    "pages/child.txt": "@extends nothere.txt@",
+                    "pages/home.txt": "@include header.txt@{name}",
+                    "pages/header.txt": "Header ",
+                    "page.txt": "@extends base.txt@@block body@{name}@endblock@",
+                    "broken.txt": "@if name@ never closed",
+                    "unknown.txt": "{name | nope}",
+                    "missing.txt": "@include nowhere.txt@",
+                },
+            )
+
+            for workers in (1, 2):
+                env = Environment()
+                report = env.preload(root, workers=workers)
+
+                self.assertEqual(
+                    sorted(report.templates),
+                    ["base.txt", "page.txt", "pages/header.txt", "pages/home.txt"],
+                )
+                self.assertEqual(
+                    sorted(report.errors),
+                    ["broken.txt", "missing.txt", "pages/child.txt", "unknown.txt"],
+                )
+                self.assertEqual(
+                    report.errors["missing.txt"], "Missing @include@: nowhere.txt"
+                )
+                self.assertIn("UnknownTransformError", report.errors["unknown.txt"])
+                self.assertEqual(len(report.times), 8)
+                self.assertGreater(report.total, 0)
+
+                self.assertEqual(
+                    report.templates["page.txt"].render({"name": "x"}), "<x>"
+                )
+                self.assertEqual(
+                    env.get_template(root / "pages" / "home.txt").render({"name": "x"}),
+                    "Header x",
+                )
+                self.assertFalse(env._parsed)
+
+                with self.assertRaises(PreloadError) as ctx:
+                    report.check()
+                self.assertIn("4 template(s) failed to load", str(ctx.exception))
+
+    def test_overlay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root,
+                {
+                    "base/layout.txt": "<@block body@@endblock@>@include footer.txt@",
+                    "base/footer.txt": "base footer",
+                    "base/page.txt": "@extends layout.txt@@block body@{name}@endblock@",
+                    "base/plain.txt": "{name|upper}",
+                    "tenant/footer.txt": "tenant footer",
+                },
+            )
+
+            base = Environment(search_path=[root / "base"])
+            tenant = base.overlay(root / "tenant")
+            other = base.overlay(root / "other")
+
+            self.assertEqual(
+                tenant.get_template("page.txt").render({"name": "x"}),
+                "<x>tenant footer",
+            )
+            self.assertEqual(
+                other.get_template("page.txt").render({"name": "x"}), "<x>base footer"
+            )
+            self.assertEqual(
+                tenant.get_template(root / "base" / "footer.txt").source,
+                root.resolve() / "tenant" / "footer.txt",
+            )
+
+            plain = tenant.get_template("plain.txt")
+            self.assertIsNot(plain, other.get_template("plain.txt"))
+            self.assertIs(plain.ast, other.get_template("plain.txt").ast)
+            self.assertIs(plain.ast, base.get_template("plain.txt").ast)
+            self.assertIs(tenant.transforms, base.transforms)
+
+    def test_overlay_after_preload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root,
+                {
+                    "base/plain.txt": "{name|upper}",
+                    "base/header.txt": "H",
+                    "tenant/page.txt": "@include header.txt@{n}",
+                },
+            )
+
+            base = Environment(search_path=[root / "base"])
+            self.assertTrue(base.preload(root / "base").ok)
+            tenant = base.overlay(root / "tenant")
+            # files the base loaded before the overlay existed aren't parsed
+            # again
+            self.assertIs(
+                tenant.get_template("plain.txt").ast,
+                base.get_template("plain.txt").ast,
+            )
+
+            # includes are found along the search path, as when rendering
+            report = tenant.preload(root / "tenant")
+            self.assertEqual(report.errors, {})
+            self.assertEqual(report.templates["page.txt"].render({"n": 1}), "H1")
+
+    def test_undefined(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root,
+                {
+                    "page.txt": (
+                        "[{user.name}]"
+                        '[{user.title ? "n/a" | upper}]'
+                        "@for item in items@{item}@endfor@"
+                        "@if admin@admin@else@user@endif@"
+                    ),
+                },
+            )
+            ctx = {"user": {}}
+
+            strict = Environment()
+            with self.assertRaises(UndefinedError) as error:
+                strict.get_template(root / "page.txt").render(ctx)
+            self.assertEqual(error.exception.name, "user.name")
+            self.assertEqual(error.exception.lineno, 1)
+            self.assertIsInstance(error.exception, KeyError)
+            self.assertEqual(
+                strict.get_template(root / "page.txt").render(
+                    {"user": {"name": "x"}, "items": [1], "admin": True}
+                ),
+                "[x][N/A]1admin",
+            )
+
+            empty = Environment(undefined=EMPTY)
+            self.assertEqual(
+                empty.get_template(root / "page.txt").render(ctx), "[][N/A]user"
+            )
+
+            default = Environment(undefined=Default("?"))
+            self.assertEqual(
+                default.get_template(root / "page.txt").render(ctx), "[?][N/A]admin"
+            )
+
+            with self.assertRaises(ValueError):
+                Environment(undefined="lenient")
+
+    def test_loop_invariants_are_hoisted(self):
+        class Config:
+            reads = 0
+
+            @property
+            def totals(self):
+                Config.reads += 1
+                return True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root,
+                {
+                    "table.txt": (
+                        "@for row in rows@@for cell in row.cells@"
+                        "{title|count}{row.name|count}{cell|count}"
+                        "@if config.totals@;@endif@"
+                        "@endfor@@endfor@"
+                    ),
+                },
+            )
+            ctx = {
+                "title": "T",
+                "config": Config(),
+                "rows": [
+                    {"name": "a", "cells": [1, 2, 3]},
+                    {"name": "b", "cells": [4]},
+                ],
+            }
+
+            calls = []
+
+            def count(value):
+                calls.append(value)
+                return value
+
+            impure = Environment()
+            impure.register_transform(count)
+            expected = impure.get_template(root / "table.txt").render(ctx)
+            self.assertEqual(expected, "Ta1;Ta2;Ta3;Tb4;")
+            self.assertEqual(len(calls), 12)
+            # conditions don't involve transforms, so are always hoisted
+            self.assertEqual(Config.reads, 1)
+
+            calls.clear()
+            pure = Environment()
+            pure.register_transform(count, pure=True)
+            template = pure.get_template(root / "table.txt")
+            self.assertEqual(template.render(ctx), expected)
+            self.assertEqual(calls, ["T", "a", 1, 2, 3, "b", 4])
+
+    def test_freeze_overlay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.write_templates(
+                root, {"base/page.txt": "{name|upper}", "one/page.txt": "{name}"}
+            )
+            base = Environment(search_path=[root / "base"])
+            one = base.overlay(root / "one")
+            two = base.overlay(root / "two")
+            template = one.get_template("page.txt")
+
+            one.freeze()
+            self.addCleanup(gc.unfreeze)
+            # the registry is shared, so it's frozen for the whole family
+            for env in (base, one, two):
+                with self.assertRaises(TemplateError):
+                    env.register_transform(str.strip, "strip")
+            self.assertEqual(template.render({"name": "a"}), "a")
+            self.assertEqual(two.get_template("page.txt").render({"name": "a"}), "A")
+
+    @skipUnless(os.path.exists("/proc/self/pagemap"), "needs Linux's pagemap")
+    def test_freeze(self):
+        env = Environment()
+        template = env.get_template(FIXTURES_DIR / "nginx.conf")
+        env.freeze()
+        self.addCleanup(gc.unfreeze)
+
+        with self.assertRaises(TemplateError):
+            env.register_transform(str.strip, "strip")
+        with self.assertRaises(TemplateError):
+            env.transforms.pop("upper")
+        self.assertIn(
+            "listen 80;", template.render({"ssl": False, "host": "x", "locations": []})
+        )
+
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            try:
+                report = env.sharing_report()
+                os.write(
+                    write, f"{report.shared_pages} {report.private_pages}".encode()
+                )
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        with os.fdopen(read) as result:
+            shared, private = map(int, result.read().split())
+
+        # pages holding other objects too may have been copied by the child
+        self.assertGreater(shared, 0)
+        report = env.sharing_report()
+        self.assertLessEqual(shared + private, report.pages)
+        self.assertGreater(report.objects, 18)
+        self.assertIn("Rss", report.process)
+
+    def test_warm_up_and_stats(self):
+        aggregator = MemoryAggregator()
+        cache = LRUCache()
+        env = Environment(instrumentation=aggregator, render_cache=cache)
+        uses_include = str(FIXTURES_DIR / "uses_include.txt")
+        greeting = str(FIXTURES_DIR / "greeting.txt")
+        missing = str(FIXTURES_DIR / "missing.txt")
+
+        report = env.warm_up(
+            [uses_include, greeting, missing],
+            {uses_include: [{"foo": 1, "bar": 2}, {"foo": 3}]},
+        )
+        self.assertEqual(list(report.templates), [greeting])
+        self.assertEqual(sorted(report.errors), [missing, uses_include])
+        self.assertIn("UndefinedError", report.errors[uses_include])
+        self.assertEqual(report.renders, 1)
+        with self.assertRaises(PreloadError):
+            report.check()
+
+        stats = env.stats()
+        base = str((FIXTURES_DIR / "base.txt").resolve())
+        self.assertEqual(stats.cold, [str(Path(greeting).resolve())])
+        info = stats.templates[str(Path(uses_include).resolve())]
+        self.assertEqual((info.renders, info.cache_hits), (2, 0))
+        self.assertEqual(info.nodes, 5)
+        self.assertGreater(info.load_seconds, 0)
+        self.assertEqual(stats.templates[base].renders, 2)
+        # warming up never fills the render cache
+        self.assertEqual(stats.render_cache, {"size": 0, "hits": 0, "misses": 0})
+        self.assertEqual(stats.transforms["upper"], 0)
+
+        template = env.get_template(greeting)
+        template.render({"name": "a"})
+        template.render({"name": "a"})
+        stats = env.stats()
+        self.assertEqual(stats.cold, [])
+        info = stats.templates[str(Path(greeting).resolve())]
+        self.assertEqual((info.renders, info.cache_hits), (1, 1))
+        self.assertEqual(stats.render_cache, {"size": 1, "hits": 1, "misses": 1})
+        self.assertEqual(stats.includes[str(Path(uses_include).resolve())], 2)
+        self.assertEqual(stats.as_dict()["templates"][base]["renders"], 2)
@@ -0,0 +1,67 @@
+from pathlib import Path
+from unittest import TestCase, mock
+
+from ziggurat import Environment
+from ziggurat.incremental import Change
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class IncrementalRenderTestCases(TestCase):
+    def setUp(self):
+        self.env = Environment()
+        self.template = self.env.get_template(FIXTURES_DIR / "dashboard.txt")
+        self.ctx = {
+            "host": {"name": "web1", "region": "eu"},
+            "cpu": 10,
+            "alert": "",
+            "disks": [{"mount": "/", "used": 50}],
+        }
+
+    def test_initial_render(self):
+        handle = self.template.incremental(self.ctx)
+        self.assertEqual(handle.result, self.template.render(self.ctx))
+
+    def test_update_matches_full_render(self):
+        handle = self.template.incremental(self.ctx)
+        handle.update({"cpu": 95, "alert": "disk full", "host.region": "us"})
+
+        ctx = dict(self.ctx, cpu=95, alert="disk full")
+        ctx["host"] = {"name": "web1", "region": "us"}
+        self.assertEqual(handle.result, self.template.render(ctx))
+        # the caller's context isn't modified
+        self.assertEqual(self.ctx["host"]["region"], "eu")
+
+    def test_only_affected_nodes_render(self):
+        handle = self.template.incremental(self.ctx)
+        with mock.patch.object(
+            self.env.renderer_cls, "visit_for", autospec=True
+        ) as visit_for:
+            handle.update({"cpu": 20})
+            visit_for.assert_not_called()
+            handle.update({"disks": []})
+            visit_for.assert_called_once()
+
+    def test_changes(self):
+        handle = self.template.incremental(self.ctx)
+        previous = handle.result
+
+        changes = handle.update({"cpu": 100, "host.name": "wéb2"})
+        self.assertEqual(
+            changes,
+            [
+                Change(6, 10, "wéb2"),
+                Change(16, 24, "cpu: 100\n"),
+            ],
+        )
+
+        patched = previous.encode("utf8")
+        for change in reversed(changes):
+            patched = (
+                patched[: change.start]
+                + change.text.encode("utf8")
+                + patched[change.end :]
+            )
+        self.assertEqual(patched.decode("utf8"), handle.result)
+
+        self.assertEqual(handle.update({"cpu": 100}), [])
@@ -0,0 +1,112 @@
+import socket
+from pathlib import Path
+from unittest import TestCase
+
+from ziggurat import Environment
+from ziggurat.exceptions import UndefinedError
+from ziggurat.instrumentation import Instrumentation, MemoryAggregator, StatsdEmitter
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.events = []
+
+    def render_start(self, template):
+        self.events.append(("start", Path(template).name))
+
+    def render_end(self, template, seconds, size, error=None):
+        self.events.append(("end", Path(template).name, size, type(error)))
+
+    def include(self, template, source):
+        self.events.append(("include", Path(template).name, source))
+
+    def macro(self, template, name):
+        self.events.append(("macro", Path(template).name, name))
+
+    def transform(self, template, name):
+        self.events.append(("transform", Path(template).name, name))
+
+
+class InstrumentationTestCases(TestCase):
+    def test_events(self):
+        recorder = Recorder()
+        env = Environment(instrumentation=recorder)
+        env.get_template(FIXTURES_DIR / "uses_include.txt").render(
+            {"foo": "bar", "bar": "foo"}
+        )
+        self.assertEqual(
+            recorder.events,
+            [
+                ("start", "uses_include.txt"),
+                ("include", "uses_include.txt", "base.txt"),
+                ("start", "base.txt"),
+                ("end", "base.txt", 23, type(None)),
+                ("end", "uses_include.txt", 36, type(None)),
+            ],
+        )
+
+    def test_render_error(self):
+        recorder = Recorder()
+        env = Environment(instrumentation=recorder)
+        with self.assertRaises(UndefinedError):
+            env.get_template(FIXTURES_DIR / "greeting.txt").render({})
+        self.assertEqual(
+            recorder.events[-1], ("end", "greeting.txt", 0, UndefinedError)
+        )
+
+    def test_memory_aggregator(self):
+        aggregator = MemoryAggregator()
+        env = Environment(instrumentation=aggregator)
+        template = env.get_template(FIXTURES_DIR / "macros.txt")
+        ctx = {"val": "hi", "some_inputs": ["text", "checkbox"]}
+        template.render(ctx)
+        template.render(ctx)
+
+        stats = aggregator.snapshot()[str(template.source)]
+        self.assertEqual(stats["renders"], 2)
+        self.assertEqual(stats["errors"], 0)
+        self.assertEqual(stats["macros"], 8)
+        self.assertEqual(sum(stats["latency_histogram"]), 2)
+        self.assertEqual(stats["output_chars"], 2 * len(template.render(ctx)))
+
+    def test_statsd_emitter(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        server.settimeout(5)
+        self.addCleanup(server.close)
+
+        emitter = StatsdEmitter(*server.getsockname(), prefix="app", root=FIXTURES_DIR)
+        self.addCleanup(emitter.close)
+        env = Environment(instrumentation=emitter)
+        env.get_template(FIXTURES_DIR / "nginx.conf").render(
+            {"ssl": True, "host": "foo.com", "locations": []}
+        )
+
+        transform = server.recv(4096).decode()
+        self.assertEqual(transform, "app.nginx.transform.lower:1|c")
+        lines = server.recv(4096).decode().split("\n")
+        self.assertEqual(lines[0], "app.nginx.render:1|c")
+        self.assertRegex(lines[1], r"^app\.nginx\.render_time:\d+\.\d{3}\|ms$")
+        self.assertEqual(lines[2], "app.nginx.output_chars:58|h")
+
+    def test_statsd_metric_names(self):
+        emitter = StatsdEmitter(root="/srv/templates")
+        self.addCleanup(emitter.close)
+        self.assertEqual(
+            emitter.metric("/srv/templates/users/index.html", "render"),
+            "ziggurat.users.index.render",
+        )
+        self.assertEqual(
+            emitter.metric("/srv/templates/admin/index.html", "render"),
+            "ziggurat.admin.index.render",
+        )
+        self.assertEqual(
+            emitter.metric("/elsewhere/my-page.txt", "render"),
+            "ziggurat.elsewhere.my_page.render",
+        )
+
+        named = StatsdEmitter(naming=lambda template: "page")
+        self.addCleanup(named.close)
+        self.assertEqual(named.metric("/a/b.txt", "render"), "ziggurat.page.render")
@@ -0,0 +1,78 @@
+from pathlib import Path
+from unittest import TestCase
+
+from ziggurat import Environment, Template
+from ziggurat.exceptions import RenderLimitExceeded
+from ziggurat.limits import Budget, RenderLimits
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def nginx_context(locations: int) -> dict:
+    return {
+        "ssl": True,
+        "host": "foo.com",
+        "locations": [{"path": "/", "sock": "sock"}] * locations,
+    }
+
+
+class RenderLimitsTestCases(TestCase):
+    def assert_exceeded(self, template, ctx, limits, limit, lineno):
+        with self.assertRaises(RenderLimitExceeded) as exc:
+            template.render(ctx, limits=limits)
+        self.assertEqual(exc.exception.limit, limit)
+        self.assertEqual(exc.exception.template, str(template.source))
+        self.assertEqual(exc.exception.lineno, lineno)
+
+    def test_within_limits(self):
+        template = Template(str(FIXTURES_DIR / "nginx.conf"))
+        limits = RenderLimits(max_output=1000, max_iterations=10, timeout=10)
+        self.assertEqual(
+            template.render(nginx_context(2), limits=limits),
+            template.render(nginx_context(2)),
+        )
+
+    def test_max_iterations(self):
+        template = Template(str(FIXTURES_DIR / "nginx.conf"))
+        limits = RenderLimits(max_iterations=10)
+        self.assert_exceeded(
+            template, nginx_context(11), limits, "max_iterations", lineno=10
+        )
+
+    def test_max_output(self):
+        template = Template(str(FIXTURES_DIR / "nginx.conf"))
+        limits = RenderLimits(max_output=100)
+        self.assert_exceeded(template, nginx_context(5), limits, "max_output", 11)
+
+    def test_timeout(self):
+        template = Template(str(FIXTURES_DIR / "nginx.conf"))
+        limits = RenderLimits(timeout=0)
+        self.assert_exceeded(template, nginx_context(100), limits, "timeout", 10)
+
+    def test_max_recursion(self):
+        template = Template(str(FIXTURES_DIR / "recursive.txt"))
+        limits = RenderLimits(max_recursion=20)
+        self.assert_exceeded(template, {"start": 1}, limits, "max_recursion", 1)
+
+    def test_max_include_depth(self):
+        env = Environment(limits=RenderLimits(max_include_depth=3))
+        template = env.get_template(FIXTURES_DIR / "self_include.txt")
+        with self.assertRaises(RenderLimitExceeded) as exc:
+            template.render({})
+        self.assertEqual(exc.exception.limit, "max_include_depth")
+        self.assertEqual(exc.exception.value, 3)
+        self.assertEqual(
+            str(exc.exception),
+            f"Render exceeded max_include_depth=3 at {template.source}:1",
+        )
+
+    def test_depths_unwind(self):
+        env = Environment()
+        budget = Budget(RenderLimits(max_recursion=5, max_include_depth=5))
+        env.get_template(FIXTURES_DIR / "uses_include.txt").render_into(
+            {"foo": 1, "bar": 2}, [], budget
+        )
+        env.get_template(FIXTURES_DIR / "macros.txt").render_into(
+            {"val": "v", "some_inputs": ["text"]}, [], budget
+        )
+        self.assertEqual((budget.include_depth, budget.macro_depth), (0, 0))
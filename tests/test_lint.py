@@ -0,0 +1,102 @@
+import io
+import json
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import TestCase
+
+from ziggurat.__main__ import main
+from ziggurat.lint import lint, lint_tree
+from ziggurat.parser import Parser
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def codes(findings):
+    return [(f.lineno, f.severity, f.code) for f in findings]
+
+
+class LintTestCases(TestCase):
+    def test_lint(self):
+        findings = lint([FIXTURES_DIR / "slow_loops.txt"])
+        self.assertEqual(
+            codes(findings),
+            [
+                (1, "error", "unguarded-recursion"),
+                (6, "info", "loop-cost"),
+                (9, "info", "loop-cost"),
+                (10, "warning", "deep-lookup-in-loop"),
+                (11, "warning", "invariant-transform"),
+                (12, "warning", "include-in-loop"),
+            ],
+        )
+        self.assertEqual(findings[2].cost, 17)
+        self.assertIn("looked up 2 time(s)", findings[3].message)
+
+    def test_clean_template(self):
+        findings = lint([FIXTURES_DIR / "macros.txt", FIXTURES_DIR / "nginx.conf"])
+        self.assertEqual({f.severity for f in findings}, {"info"})
+
+    def test_loop_cost(self):
+        tree = Parser("@for a in b@{a|upper}@for c in d@{c}@endfor@@endfor@").parse()
+        self.assertEqual(
+            [(f.code, f.cost) for f in lint_tree(tree, "t")],
+            [("loop-cost", 14), ("loop-cost", 1)],
+        )
+        self.assertEqual(lint_tree(tree, "t", max_cost=10)[0].severity, "warning")
+
+    def test_pure_transforms_are_hoisted(self):
+        tree = Parser("@for a in b@{c|upper}{c|slug}@endfor@").parse()
+        self.assertEqual(
+            [
+                f.message
+                for f in lint_tree(tree, "t")
+                if f.code == "invariant-transform"
+            ],
+            [
+                "slug of c doesn't depend on the loop but is recomputed every iteration, "
+                "as slug isn't registered as pure"
+            ],
+        )
+        self.assertEqual(
+            codes(lint_tree(tree, "t", pure=["upper", "slug"])),
+            [(1, "info", "loop-cost")],
+        )
+
+    def test_mutual_recursion(self):
+        tree = Parser(
+            "@macro a(x)@{!b x=x}@endmacro@"
+            "@macro b(x)@@if x@{!a x=x}@endif@{!c x=x}@endmacro@"
+            "@macro c(x)@{!b x=x}@endmacro@"
+        ).parse()
+        findings = lint_tree(tree, "t")
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(
+            findings[0].message,
+            "b -> c -> b recurses without an @if@ or @for@ base case",
+        )
+
+    def test_recursion_through_a_loop(self):
+        # the loop is the base case, it ends once a node has no children
+        findings = lint([FIXTURES_DIR / "recursive_tree.txt"])
+        self.assertEqual(codes(findings), [(2, "info", "loop-cost")])
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(
+                main(["lint", str(FIXTURES_DIR / "recursive_tree.txt")]), 0
+            )
+
+    def test_parse_error(self):
+        findings = lint([FIXTURES_DIR / "nope.txt"])
+        self.assertEqual(codes(findings), [(None, "error", "parse-error")])
+
+    def test_cli(self):
+        with redirect_stdout(io.StringIO()) as stdout:
+            status = main(["lint", str(FIXTURES_DIR / "slow_loops.txt")])
+        self.assertEqual(status, 1)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 4)
+
+        with redirect_stdout(io.StringIO()) as stdout:
+            status = main(
+                ["lint", str(FIXTURES_DIR / "nginx.conf"), "--format", "json"]
+            )
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout.getvalue())[0]["code"], "loop-cost")
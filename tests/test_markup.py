@@ -0,0 +1,17 @@
+from unittest import TestCase
+
+from ziggurat.markup import Markup, escape, safe
+
+
+class MarkupTestCases(TestCase):
+    def test_escape(self):
+        self.assertEqual(
+            escape("<a href='x'>&\"</a>"),
+            "&lt;a href=&#39;x&#39;&gt;&amp;&#34;&lt;/a&gt;",
+        )
+        self.assertIsInstance(escape("x"), Markup)
+        self.assertEqual(escape(42), "42")
+
+    def test_escape_leaves_markup_alone(self):
+        self.assertEqual(escape(Markup("<b>")), "<b>")
+        self.assertEqual(escape(safe("<b>")), "<b>")
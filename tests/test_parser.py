@@ -121,6 +121,21 @@ class ParserTestCases(TestCase):
             ctx.exception.args[0], "Expected closing quote (') for string literal"
         )
 
+    def test_lineno(self):
+        parser = Parser("a\nb\n\nc")
+        parser.cursor = 4
+        self.assertEqual(parser.lineno(), 3)
+        parser.cursor = 5
+        self.assertEqual(parser.lineno(), 4)
+        parser.cursor = 2
+        self.assertEqual(parser.lineno(), 2)
+
+        block = Parser("Hi\n@for i in items@\n{i}\n@endfor@\n{x}").parse()
+        self.assertEqual([node.lineno for node in block.nodes], [1, 2, 5])
+        for_loop = block.nodes[1]
+        assert isinstance(for_loop, ast.For)
+        self.assertEqual([node.lineno for node in for_loop.body.nodes], [3, 3])
+
     def test_text(self):
         text = Parser("abc xyz").text()
         self.assert_ast(text, "Text('abc xyz')")
@@ -152,11 +167,38 @@ class ParserTestCases(TestCase):
             lookup, "Lookup(var transforms=['upper', 'lower', 'capitalize'])"
         )
 
+        lookup = Parser('{var ? "none" | upper}').lookup()
+        self.assert_ast(lookup, "Lookup(var transforms=['upper'] default='none')")
+
+        lookup = Parser("{var?''}").lookup()
+        self.assert_ast(lookup, "Lookup(var default='')")
+
+        with self.assertRaises(Exception):
+            Parser("{var ? none}").lookup()
+
     def test_include(self):
         include = Parser("@include foo.txt@").include()
         expected_ast = "Include(foo.txt)"
         self.assert_ast(include, expected_ast)
 
+    def test_extends(self):
+        extends = Parser("@extends base.txt@\n").extends()
+        self.assert_ast(extends, "Extends(base.txt)")
+
+    def test_section(self):
+        section = Parser("@block title@\nHello {name}\n@endblock@\n").section()
+        expected_ast = """
+        Section(
+          name=title
+          Block([
+            Text('Hello ')
+            Lookup(name)
+            Text('\\n')
+          ])
+        )
+        """
+        self.assert_ast(section, expected_ast)
+
     def test_macro(self):
         macro = Parser("@macro no_args()@Some text@endmacro@").macro()
         expected_ast = """
@@ -1,6 +1,11 @@
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest import TestCase
 
+from ziggurat import ast
+from ziggurat.exceptions import TemplateError
 from ziggurat.template import Template, register_transform
 
 FIXTURES_DIR = Path(__file__).parent / "fixtures"
@@ -52,6 +57,32 @@ server {
 """,
         )
 
+    def test_render_concurrently_with_shared_context(self):
+        template = Template(str(FIXTURES_DIR / "nginx.conf"))
+        ctx = {
+            "ssl": False,
+            "host": "foo.com",
+            "locations": [{"path": f"/{i}/", "sock": str(i)} for i in range(50)],
+        }
+        expected = template.render(ctx)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: template.render(ctx), range(64)))
+
+        self.assertEqual(results, [expected] * 64)
+        self.assertNotIn("location", ctx)
+        self.assertEqual(template.renders, 65)
+
+    def test_render_with_defaultdict_context(self):
+        template = Template(str(FIXTURES_DIR / "greeting.txt"))
+        self.assertEqual(template.render(defaultdict(lambda: "C")), "Hello C!")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "dotted.txt"
+            path.write_text("{a.b}|{c}")
+            ctx = defaultdict(lambda: defaultdict(str), c="C")
+            self.assertEqual(Template(str(path)).render(ctx), "|C")
+
     def test_render_with_include(self):
         # @include basically invokes sub template rendering
         template_path = str(FIXTURES_DIR / "uses_include.txt")
@@ -61,6 +92,26 @@ server {
             template.render(ctx), "Some base with foo=bar\n\nand bar=foo\n"
         )
 
+    def test_render_with_extends(self):
+        template = Template(str(FIXTURES_DIR / "page.txt"))
+        ctx = {"greeting": "hi", "company": "Acme"}
+        self.assertEqual(
+            template.render(ctx), "<title>Default title</title>\nHI!\n-- Acme\n"
+        )
+        # the inheritance chain is merged when loaded
+        self.assertFalse(
+            any(isinstance(node, ast.Extends) for node in template.ast.nodes)
+        )
+
+        template = Template(str(FIXTURES_DIR / "page_two.txt"))
+        self.assertEqual(
+            template.render(ctx), "<title>Page two</title>\nHI!\n-- Acme\n"
+        )
+
+    def test_circular_extends(self):
+        with self.assertRaises(TemplateError):
+            Template(str(FIXTURES_DIR / "circular.txt"))
+
     def test_includes_registered_transforms(self):
         def custom_transform(value):
             return value[0]
@@ -71,6 +122,50 @@ server {
         template = Template(template_path)
         self.assertEqual(template.render({"name": "World"}), "Hello W!")
 
+    def test_render_into_shares_sink(self):
+        template = Template(str(FIXTURES_DIR / "macros.txt"))
+        sink = ["before"]
+        ctx = {"val": "hi", "some_inputs": ["text"]}
+        template.render_into(ctx, sink)
+
+        self.assertEqual(sink[0], "before")
+        self.assertEqual("".join(sink[1:]), template.render(ctx))
+        # macro output is written piece by piece, not joined per call
+        self.assertEqual([piece.count("<input") for piece in sink].count(1), 2)
+        self.assertTrue(all(piece.count("<input") <= 1 for piece in sink))
+
+        template = Template(str(FIXTURES_DIR / "uses_include.txt"))
+        sink = template.render_into({"foo": "bar", "bar": "foo"}, [])
+        self.assertEqual(sink[:3], ["Some base with foo=", "bar", "\n"])
+
+    def test_stream(self):
+        template = Template(str(FIXTURES_DIR / "export.csv"))
+        pulled = []
+
+        def rows():
+            for i in range(10):
+                pulled.append(i)
+                yield {"id": i, "name": f"n{i}"}
+
+        chunks = []
+        written = template.stream(
+            {"rows": rows()}, lambda chunk: chunks.append((chunk, len(pulled))), 4
+        )
+
+        expected = template.render({"rows": rows()})
+        self.assertEqual("".join(chunk for chunk, _ in chunks), expected)
+        self.assertEqual(written, len(expected))
+        # rows are pulled as the loop goes, with output written every 4
+        self.assertEqual([count for _, count in chunks], [4, 8, 10])
+        self.assertTrue(chunks[0][0].startswith("id,name\n0,n0\n"))
+
+        chunks.clear()
+        template.stream({"rows": rows()}, chunks.append, flush_size=10)
+        self.assertEqual(
+            chunks[:3], ["id,name\n0,n0\n", "1,n1\n2,n2\n", "3,n3\n4,n4\n"]
+        )
+        self.assertEqual(len(chunks), 6)
+
     def test_bad_path(self):
         template_path = str(FIXTURES_DIR / "doesnt_exist.txt")
         with self.assertRaises(FileNotFoundError):
@@ -82,6 +82,19 @@ class RendererTestCases(TestCase):
         renderer = self.render(for_loop, {"list": []})
         self.assertEqual(renderer.result, "")
 
+    def test_visit_for_does_not_mutate_context(self):
+        for_loop = ast.For(
+            name="item",
+            iterator="items",
+            body=ast.Block([ast.Lookup("item", transforms=[])]),
+        )
+        context = {"items": [1, 2], "item": "outer"}
+        renderer = self.render(
+            ast.Block([for_loop, ast.Lookup("item", transforms=[])]), context
+        )
+        self.assertEqual(renderer.result, "12outer")
+        self.assertEqual(context, {"items": [1, 2], "item": "outer"})
+
     def test_visit_include(self):
         include = ast.Include(f'{FIXTURES_DIR / "base.txt"}')
         renderer = self.render(include, {"foo": "bar"}, base=FIXTURES_DIR)
@@ -1,3 +1,4 @@
+from ziggurat.environment import Environment
 from ziggurat.template import Template, register_transform
 
 __author__ = "Ryan Siemens"
@@ -0,0 +1,191 @@
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from ziggurat import batch, benchmark, bundle, lint
+from ziggurat.environment import default_environment
+from ziggurat.exceptions import PreloadError
+
+
+def render(args: argparse.Namespace) -> int:
+    try:
+        batch.load(args.template, args.imports)
+    except Exception as e:
+        print(f"Can't load {args.template}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+
+    if args.out == "-":
+        write = batch.stream_writer(sys.stdout)
+    else:
+        write = batch.directory_writer(Path(args.out), Path(args.template).suffix)
+
+    if args.contexts == "-":
+        report = batch.render_batch(
+            args.template, sys.stdin, write, args.workers, args.imports
+        )
+    else:
+        with open(args.contexts, "r", encoding="utf8") as contexts:
+            report = batch.render_batch(
+                args.template, contexts, write, args.workers, args.imports
+            )
+
+    sys.stdout.flush()
+    print(report.summary(), file=sys.stderr)
+    return 1 if report.failed else 0
+
+
+def bench_memory(args: argparse.Namespace) -> int:
+    for module in args.imports:
+        importlib.import_module(module)
+
+    sources = benchmark.discover(args.paths, args.pattern)
+    loop_sizes = [int(size) for size in args.loop_sizes.split(",")]
+    report = benchmark.run(sources, loop_sizes, default_environment)
+
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.out, "w", encoding="utf8") as out:
+            json.dump(report, out, indent=2)
+    return 1 if any(t["error"] for t in report["templates"]) else 0
+
+
+def lint_templates(args: argparse.Namespace) -> int:
+    for module in args.imports:
+        importlib.import_module(module)
+
+    sources = benchmark.discover(args.paths, args.pattern)
+    findings = lint.lint(
+        sources, max_cost=args.max_cost, pure=default_environment.transforms.pure
+    )
+
+    if args.format == "json":
+        json.dump([finding._asdict() for finding in findings], sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for finding in findings:
+            if finding.severity != "info" or args.verbose:
+                print(finding)
+
+    fail_on = lint.SEVERITIES.index(args.fail_on)
+    failed = [
+        finding
+        for finding in findings
+        if lint.SEVERITIES.index(finding.severity) >= fail_on
+    ]
+    return 1 if failed else 0
+
+
+def write_bundle(args: argparse.Namespace) -> int:
+    try:
+        report = bundle.write_bundle(
+            args.root, args.out, args.pattern, workers=args.workers
+        )
+    except PreloadError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(report.summary(), file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ziggurat")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_cmd = commands.add_parser(
+        "render", help="render a template once per line of an NDJSON context stream"
+    )
+    render_cmd.add_argument("template")
+    render_cmd.add_argument(
+        "--contexts", default="-", help="NDJSON file of contexts (default: stdin)"
+    )
+    render_cmd.add_argument(
+        "--out",
+        default="-",
+        help="directory to write one file per context into, or - for stdout",
+    )
+    render_cmd.add_argument("--workers", type=int, default=1)
+    render_cmd.add_argument(
+        "--import",
+        dest="imports",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="module to import first, e.g. one registering transforms",
+    )
+    render_cmd.set_defaults(func=render)
+
+    bench_cmd = commands.add_parser(
+        "bench-memory",
+        help="measure the memory of parsed templates and their renders as JSON",
+    )
+    bench_cmd.add_argument("paths", nargs="+", help="templates or directories")
+    bench_cmd.add_argument("--pattern", default="**/*")
+    bench_cmd.add_argument(
+        "--loop-sizes",
+        default="10,100,1000",
+        help="comma separated iterations per loop to render with",
+    )
+    bench_cmd.add_argument("--out", default="-", help="JSON file, or - for stdout")
+    bench_cmd.add_argument(
+        "--import",
+        dest="imports",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="module to import first, e.g. one registering transforms",
+    )
+    bench_cmd.set_defaults(func=bench_memory)
+
+    lint_cmd = commands.add_parser(
+        "lint", help="report template patterns which are slow to render"
+    )
+    lint_cmd.add_argument("paths", nargs="+", help="templates or directories")
+    lint_cmd.add_argument("--pattern", default="**/*")
+    lint_cmd.add_argument(
+        "--max-cost",
+        type=int,
+        default=50,
+        help="estimated cost of a loop iteration to warn from",
+    )
+    lint_cmd.add_argument("--format", choices=["text", "json"], default="text")
+    lint_cmd.add_argument(
+        "--fail-on",
+        choices=lint.SEVERITIES,
+        default="warning",
+        help="exit with 1 if there are findings this severe (default: warning)",
+    )
+    lint_cmd.add_argument(
+        "-v", "--verbose", action="store_true", help="include info findings in text"
+    )
+    lint_cmd.add_argument(
+        "--import",
+        dest="imports",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="module to import first, e.g. one registering pure transforms",
+    )
+    lint_cmd.set_defaults(func=lint_templates)
+
+    bundle_cmd = commands.add_parser(
+        "bundle", help="parse a directory of templates into a single bundle file"
+    )
+    bundle_cmd.add_argument("root", help="directory of templates")
+    bundle_cmd.add_argument("--out", required=True, help="bundle file to write")
+    bundle_cmd.add_argument("--pattern", default="**/*")
+    bundle_cmd.add_argument(
+        "--workers", type=int, default=None, help="parsing processes (default: CPUs)"
+    )
+    bundle_cmd.set_defaults(func=write_bundle)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
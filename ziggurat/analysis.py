@@ -0,0 +1,140 @@
+"""
+Static analysis of template trees.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+from ziggurat import ast
+from ziggurat.visitor import NodeVisitor
+
+if TYPE_CHECKING:
+    from ziggurat.template import Template
+
+
+class ContextPaths(NodeVisitor):
+    """
+    Collects the dotted paths of the context a tree reads, e.g. `user.name`.
+
+    Names bound by loops aren't context paths, a loop depends on the whole of
+    its iterator instead. Macro bodies only see their parameters, so they're
+    covered by the paths of the arguments at each call. Includes are followed
+    when `load` is given; if one can't be loaded `complete` is set to False
+    as the paths then don't cover everything the tree reads.
+    """
+
+    def __init__(
+        self,
+        load: Optional[Callable[[Path], "Template"]] = None,
+        base: Optional[Path] = None,
+    ):
+        self.load = load
+        self.base = base
+        self.paths: Set[str] = set()
+        self.complete = True
+        self._bound: List[str] = []
+        self._including: Set[Path] = set()
+
+    def add(self, name: str):
+        if name.split(".", 1)[0] not in self._bound:
+            self.paths.add(name)
+
+    def minimal(self) -> List[str]:
+        """The paths, sorted, without any covered by a shorter path."""
+        result: List[str] = []
+        for path in sorted(self.paths):
+            if not result or not path.startswith(result[-1] + "."):
+                result.append(path)
+        return result
+
+    def visit_if(self, node: ast.If):
+        self.add(node.condition)
+        super().visit_if(node)
+
+    def visit_for(self, node: ast.For):
+        self.add(node.iterator)
+        self._bound.append(node.name)
+        try:
+            node.body.accept(self)
+        finally:
+            self._bound.pop()
+
+    def visit_lookup(self, node: ast.Lookup):
+        self.add(node.name)
+
+    def visit_macro(self, node: ast.Macro):
+        pass
+
+    def visit_include(self, node: ast.Include):
+        if self.load is None or self.base is None:
+            self.complete = False
+            return
+
+        try:
+            template = self.load(self.base / node.source)
+        except Exception:
+            self.complete = False
+            return
+
+        if template.source in self._including:
+            return  # recursive, the template's paths are already being collected
+
+        base = self.base
+        self.base = template.source.parent
+        self._including.add(template.source)
+        try:
+            template.ast.accept(self)
+        finally:
+            self._including.discard(template.source)
+            self.base = base
+
+
+class NodeCounter(NodeVisitor):
+    """Counts the nodes of a tree, by node type."""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def count(self, node: ast.AST):
+        name = type(node).__name__
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def visit_block(self, node: ast.Block):
+        self.count(node)
+        super().visit_block(node)
+
+    def visit_if(self, node: ast.If):
+        self.count(node)
+        super().visit_if(node)
+
+    def visit_for(self, node: ast.For):
+        self.count(node)
+        super().visit_for(node)
+
+    def visit_include(self, node: ast.Include):
+        self.count(node)
+
+    def visit_extends(self, node: ast.Extends):
+        self.count(node)
+
+    def visit_section(self, node: ast.Section):
+        self.count(node)
+        super().visit_section(node)
+
+    def visit_macro(self, node: ast.Macro):
+        self.count(node)
+        super().visit_macro(node)
+
+    def visit_text(self, node: ast.Text):
+        self.count(node)
+
+    def visit_lookup(self, node: ast.Lookup):
+        self.count(node)
+
+    def visit_call(self, node: ast.Call):
+        self.count(node)
+        super().visit_call(node)
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Dict, List, Union
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
 
 if TYPE_CHECKING:
     from ziggurat.visitor import Visitor
 
 
 class AST(ABC):
+    # the line the node starts on in its template, set by the parser
+    lineno: Optional[int] = None
+
     @abstractmethod
     def accept(self, visitor: Visitor):
         ...
@@ -26,6 +29,8 @@ class If(AST):
         self.condition = condition
         self.consequence = consequence
         self.alternative = alternative
+        # see `Lookup.hoist`
+        self.hoist: Optional[int] = None
 
     def accept(self, visitor: Visitor):
         visitor.visit_if(self)
@@ -49,6 +54,25 @@ class Include(AST):
         visitor.visit_include(self)
 
 
+class Extends(AST):
+    def __init__(self, source: str):
+        self.source = source
+
+    def accept(self, visitor: Visitor):
+        visitor.visit_extends(self)
+
+
+class Section(AST):
+    """A named `@block name@` which templates extending this one can override."""
+
+    def __init__(self, name: str, body: Block):
+        self.name = name
+        self.body = body
+
+    def accept(self, visitor: Visitor):
+        visitor.visit_section(self)
+
+
 class Macro(AST):
     def __init__(self, name: str, parameters: List[str], body: Block):
         self.name = name
@@ -68,9 +92,19 @@ class Text(AST):
 
 
 class Lookup(AST):
-    def __init__(self, name: str, transforms: List[str]):
+    def __init__(self, name: str, transforms: List[str], default: Optional[str] = None):
         self.name = name
         self.transforms = transforms
+        # rendered in place of a missing name, from `{name ? "default"}`
+        self.default = default
+        # the transform functions, resolved by name when the template is loaded
+        self.funcs: Optional[Tuple[Callable, ...]] = None
+        # whether the last transform produces markup which must not be escaped
+        self.safe = False
+        # set for lookups in loops which don't depend on (some of) the loops,
+        # the index of the outermost such loop, counting from the outside. The
+        # renderer evaluates them once per entry to that loop.
+        self.hoist: Optional[int] = None
 
     def accept(self, visitor: Visitor):
         visitor.visit_lookup(self)
@@ -0,0 +1,201 @@
+"""
+Render one template against a stream of contexts, e.g. for bulk document
+generation. Used by `python -m ziggurat render`.
+"""
+
+import importlib
+import json
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import IO, Callable, Deque, Iterable, List, Optional, Tuple
+
+from ziggurat.environment import default_environment
+from ziggurat.template import Template
+
+# (line number, output, render seconds, error message)
+Result = Tuple[int, Optional[str], float, Optional[str]]
+
+_template: Optional[Template] = None
+
+
+def load(source: str, imports: Iterable[str] = ()) -> Template:
+    """
+    Import `imports`, modules expected to register transforms, and load the
+    template at `source` into the default environment.
+    """
+    for module in imports:
+        importlib.import_module(module)
+    return default_environment.get_template(source)
+
+
+def _init_worker(source: str, imports: List[str]):
+    global _template
+    _template = load(source, imports)
+
+
+def _render_line(template: Template, lineno: int, line: str) -> Result:
+    start = time.perf_counter()
+    try:
+        output = template.render(json.loads(line))
+    except Exception as e:
+        return lineno, None, time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return lineno, output, time.perf_counter() - start, None
+
+
+def _render_in_worker(lineno: int, line: str) -> Result:
+    assert _template is not None
+    return _render_line(_template, lineno, line)
+
+
+# failures kept with their error messages, the rest are only counted
+MAX_FAILURES = 100
+# latencies kept to estimate the percentiles from, a uniform sample of all of
+# them once there are more
+LATENCY_SAMPLE = 10_000
+
+
+class BatchReport:
+    """
+    The outcome of a batch. Memory stays bounded however many contexts are
+    rendered: only the first `MAX_FAILURES` failures are kept (`failed`
+    counts all of them), and percentiles are computed from a random sample
+    of `LATENCY_SAMPLE` latencies.
+    """
+
+    def __init__(self):
+        self.rendered = 0
+        self.failed = 0
+        self.failures: List[Tuple[int, str]] = []
+        self.elapsed = 0.0
+        self.latencies = array("d")
+        self._latency_count = 0
+        # seeded so percentiles of the same batch are reproducible
+        self._random = random.Random(0)
+
+    def add_latency(self, seconds: float):
+        # reservoir sampling, every latency is equally likely to be kept
+        self._latency_count += 1
+        if len(self.latencies) < LATENCY_SAMPLE:
+            self.latencies.append(seconds)
+        else:
+            slot = self._random.randrange(self._latency_count)
+            if slot < LATENCY_SAMPLE:
+                self.latencies[slot] = seconds
+
+    def add_failure(self, lineno: int, error: str):
+        self.failed += 1
+        if len(self.failures) < MAX_FAILURES:
+            self.failures.append((lineno, error))
+
+    @property
+    def total(self) -> int:
+        return self.rendered + self.failed
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Nearest-rank percentile of the sampled render latencies, in seconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def summary(self) -> str:
+        lines = [
+            f"rendered {self.rendered}/{self.total} contexts in {self.elapsed:.3f}s "
+            f"({self.throughput:.1f}/s)",
+            "latency p50={:.2f}ms p90={:.2f}ms p99={:.2f}ms max={:.2f}ms".format(
+                *(self.percentile(p) * 1000 for p in (50, 90, 99, 100))
+            ),
+        ]
+        if self.failed:
+            lines.append(f"{self.failed} failed:")
+            lines.extend(f"  line {lineno}: {error}" for lineno, error in self.failures)
+            if self.failed > len(self.failures):
+                lines.append(f"  and {self.failed - len(self.failures)} more")
+        return "\n".join(lines)
+
+
+def render_batch(
+    source: str,
+    contexts: Iterable[str],
+    write: Callable[[int, str], None],
+    workers: int = 1,
+    imports: Iterable[str] = (),
+) -> BatchReport:
+    """
+    Render `source` once per NDJSON line in `contexts`, calling `write` with
+    the line number and output of each successful render, in input order.
+
+    With more than one worker, renders run in a process pool with at most
+    `workers * 2` contexts in flight, so memory stays bounded however long the
+    stream is.
+
+    The template is loaded before any worker starts, so errors loading it
+    are raised here rather than breaking the pool.
+    """
+    imports = list(imports)
+    template = load(source, imports)
+    report = BatchReport()
+    start = time.perf_counter()
+
+    def collect(result: Result):
+        lineno, output, latency, error = result
+        report.add_latency(latency)
+        if error is not None:
+            report.add_failure(lineno, error)
+        else:
+            report.rendered += 1
+            write(lineno, output)  # type: ignore[arg-type]
+
+    lines = (
+        (lineno, line) for lineno, line in enumerate(contexts, start=1) if line.strip()
+    )
+
+    if workers <= 1:
+        for lineno, line in lines:
+            collect(_render_line(template, lineno, line))
+    else:
+        pending: Deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(source, imports)
+        ) as pool:
+            for lineno, line in lines:
+                pending.append(pool.submit(_render_in_worker, lineno, line))
+                if len(pending) >= workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def directory_writer(out: Path, suffix: str) -> Callable[[int, str], None]:
+    out.mkdir(parents=True, exist_ok=True)
+
+    def write(lineno: int, output: str):
+        with open(out / f"{lineno}{suffix}", "w", encoding="utf8") as f:
+            f.write(output)
+
+    return write
+
+
+def stream_writer(stream: IO[str]) -> Callable[[int, str], None]:
+    """
+    Writes outputs as NDJSON, `{"line": 1, "output": "..."}` per line, so
+    outputs (which may span lines) can be split apart and matched to their
+    contexts.
+    """
+
+    def write(lineno: int, output: str):
+        stream.write(json.dumps({"line": lineno, "output": output}) + "\n")
+
+    return write
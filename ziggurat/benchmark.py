@@ -0,0 +1,140 @@
+"""
+Memory benchmarks: the memory held by parsed templates and the peak
+allocated while rendering them, measured with tracemalloc. Used by
+`python -m ziggurat bench-memory`.
+"""
+
+import gc
+import platform
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional
+
+import ziggurat
+from ziggurat.analysis import NodeCounter
+from ziggurat.environment import Environment
+from ziggurat.prefork import tree_objects
+from ziggurat.template import Template
+
+
+class Sample(str):
+    """
+    Stand in for any context value: every attribute is another sample and
+    iterating one yields `loop_size` samples, so a template can be rendered
+    without a real context.
+    """
+
+    loop_size = 10
+
+    def __getattr__(self, name: str) -> "Sample":
+        return self
+
+    def __iter__(self) -> Iterator["Sample"]:  # type: ignore[override]
+        return (self for _ in range(self.loop_size))
+
+
+class SampleContext(Mapping[str, Any]):
+    """A context with a sample for every name."""
+
+    def __init__(self, loop_size: int, text: str = "sample"):
+        self.sample = type("Sample", (Sample,), {"loop_size": loop_size})(text)
+
+    def __getitem__(self, name: str) -> Any:
+        return self.sample
+
+    def __contains__(self, name: object) -> bool:
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(())
+
+    def __len__(self) -> int:
+        return 0
+
+
+def ast_bytes(template: Template) -> int:
+    """
+    Bytes of the objects making up the tree `template` holds, with any
+    `@extends@` resolved, each object counted once.
+    """
+    return sum(map(sys.getsizeof, tree_objects([template])))
+
+
+def peak_render_bytes(
+    render: Callable[[Mapping[str, Any]], str], ctx: Mapping[str, Any]
+) -> Dict[str, int]:
+    """The peak bytes allocated while calling `render(ctx)`."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        output = render(ctx)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "output_chars": len(output)}
+
+
+def measure(
+    source: str,
+    environment: Environment,
+    loop_sizes: Iterable[int] = (10, 100, 1000),
+    context: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Measure one template, rendering it with `context` if given, otherwise
+    with a `SampleContext` for each of `loop_sizes`.
+    """
+    result: Dict[str, Any] = {
+        "template": source,
+        "ast_nodes": None,
+        "ast_bytes": None,
+        "renders": [],
+        "error": None,
+    }
+    try:
+        template = environment.get_template(source)
+        counter = NodeCounter()
+        template.ast.accept(counter)
+        # both measured on the same (extended) tree
+        result["ast_nodes"] = counter.total
+        result["ast_bytes"] = ast_bytes(template)
+
+        if context is not None:
+            result["renders"].append(peak_render_bytes(template.render, context))
+        else:
+            for loop_size in loop_sizes:
+                render = peak_render_bytes(template.render, SampleContext(loop_size))
+                result["renders"].append({"loop_size": loop_size, **render})
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run(
+    sources: Iterable[str],
+    loop_sizes: Iterable[int] = (10, 100, 1000),
+    environment: Optional[Environment] = None,
+) -> Dict[str, Any]:
+    """Measure every template, returning a JSON serializable report."""
+    environment = environment or Environment()
+    loop_sizes = list(loop_sizes)
+    return {
+        "ziggurat": ziggurat.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "loop_sizes": loop_sizes,
+        "templates": [measure(source, environment, loop_sizes) for source in sources],
+    }
+
+
+def discover(paths: Iterable[str], pattern: str = "**/*") -> List[str]:
+    """Expand directories in `paths` to the files under them."""
+    sources: List[str] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            sources.extend(str(p) for p in sorted(path.glob(pattern)) if p.is_file())
+        else:
+            sources.append(str(path))
+    return sources
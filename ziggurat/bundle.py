@@ -0,0 +1,138 @@
+"""
+Bundles: the parsed templates of a directory tree in a single file, so they
+can be deployed and loaded without reading (or parsing) every template.
+
+A bundle is a header, a JSON index of template name -> (offset, length) and
+the pickled trees. Bundles are loaded with `pickle`, so only load trusted
+ones.
+"""
+
+import json
+import mmap
+import os
+import pickle
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+from ziggurat import ast
+from ziggurat.environment import parse_files
+from ziggurat.exceptions import PreloadError, TemplateError
+from ziggurat.parser import Parser
+
+MAGIC = b"ZGB1"
+_HEADER = struct.Struct("<4sQ")
+
+
+class BundleReport:
+    def __init__(self, path: Path):
+        self.path = path
+        self.templates = 0
+        self.size = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"bundled {self.templates} templates into {self.path} "
+            f"({self.size} bytes) in {self.elapsed:.2f}s"
+        )
+
+
+def write_bundle(
+    root: Union[str, Path],
+    out: Union[str, Path],
+    pattern: str = "**/*",
+    encoding: str = "utf8",
+    parser_cls: Type[Parser] = Parser,
+    workers: Optional[int] = None,
+) -> BundleReport:
+    """
+    Parse every file under `root` matching `pattern` into a bundle at `out`,
+    templates being named by their path relative to `root`. Raises a
+    `PreloadError` listing every file which fails to parse.
+    """
+    start = time.perf_counter()
+    root = Path(root).resolve()
+    paths = sorted(str(path) for path in root.glob(pattern) if path.is_file())
+
+    index: Dict[str, Tuple[int, int]] = {}
+    blobs: List[bytes] = []
+    errors: Dict[str, str] = {}
+    offset = 0
+    for path, tree, error, _ in parse_files(paths, encoding, parser_cls, workers):
+        name = Path(path).relative_to(root).as_posix()
+        if error is not None:
+            errors[name] = error
+            continue
+        blob = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        index[name] = (offset, len(blob))
+        blobs.append(blob)
+        offset += len(blob)
+    if errors:
+        raise PreloadError(errors)
+
+    header = json.dumps({"templates": index}, sort_keys=True).encode("utf8")
+    report = BundleReport(Path(out))
+    # written to a temporary file and renamed so readers never see half a
+    # bundle
+    tmp = f"{out}.tmp"
+    with open(tmp, "wb") as bundle:
+        bundle.write(_HEADER.pack(MAGIC, len(header)))
+        bundle.write(header)
+        for blob in blobs:
+            bundle.write(blob)
+        report.size = bundle.tell()
+    os.replace(tmp, out)
+
+    report.templates = len(index)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+class Bundle:
+    """
+    A bundle file, memory mapped. Its templates are available to an
+    `Environment` under `root`, by default the bundle's path without its
+    suffix (`templates.zgb` -> `templates/`), and are only deserialized when
+    first loaded.
+    """
+
+    def __init__(self, path: Union[str, Path], root: Union[str, Path, None] = None):
+        self.path = Path(path)
+        self.root = Path(root if root is not None else self.path.with_suffix(""))
+        self.root = self.root.resolve()
+
+        with open(self.path, "rb") as bundle:
+            self._map = mmap.mmap(bundle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise TemplateError(f"{self.path} is not a template bundle")
+        _, length = _HEADER.unpack_from(self._map, 0)
+        start = _HEADER.size
+        header = json.loads(bytes(self._map[start : start + length]))
+        self._data = start + length
+        self.index: Dict[str, Tuple[int, int]] = {
+            name: (offset, size) for name, (offset, size) in header["templates"].items()
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def name(self, path: Path) -> Optional[str]:
+        """The name of the bundled template at `path`, if there is one."""
+        if path.is_absolute():
+            try:
+                path = Path(os.path.normpath(path)).relative_to(self.root)
+            except ValueError:
+                return None
+        name = Path(os.path.normpath(path)).as_posix()
+        return name if name in self.index else None
+
+    def load(self, name: str) -> ast.Block:
+        offset, size = self.index[name]
+        start = self._data + offset
+        return pickle.loads(self._map[start : start + size])
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,135 @@
+"""
+Caching of whole renders, keyed on the values of only the context paths a
+template (including its includes and macro calls) reads.
+"""
+
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+from ziggurat.undefined import UNDEFINED, get_item
+
+
+class Uncacheable(Exception):
+    """Raised when a value can't be given a stable fingerprint."""
+
+
+class RenderCache(ABC):
+    """
+    Interface of render cache backends, mapping string keys to rendered
+    output. Implementations must be thread safe.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        ...
+
+
+class LRUCache(RenderCache):
+    """
+    An in memory cache holding up to `maxsize` renders, evicting the least
+    recently used first. Entries older than `ttl` seconds are treated as
+    missing.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                self.ttl is None or time.monotonic() - entry[0] < self.ttl
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def lookup_path(ctx: Mapping[str, Any], path: str) -> Any:
+    """Resolve a dotted path the way the renderer does, or `UNDEFINED`."""
+    value: Any = ctx
+    for part in path.split("."):
+        if isinstance(value, dict) or value is ctx:
+            value = get_item(value, part)
+        else:
+            value = getattr(value, part, UNDEFINED)
+        if value is UNDEFINED:
+            break
+    return value
+
+
+def _encode(value: Any, out: List[str]):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        out.append(f"{type(value).__name__}:{value!r}")
+    elif isinstance(value, dict):
+        out.append("{")
+        for key in sorted(value, key=repr):
+            _encode(key, out)
+            _encode(value[key], out)
+        out.append("}")
+    elif isinstance(value, (list, tuple)):
+        out.append("[")
+        for item in value:
+            _encode(item, out)
+        out.append("]")
+    elif isinstance(value, (set, frozenset)):
+        out.append("{")
+        out.extend(sorted(repr(item) for item in value))
+        out.append("}")
+    elif hasattr(value, "__next__") or not hasattr(value, "__dict__"):
+        # iterators would be consumed, and other objects hold state we can't see
+        raise Uncacheable(f"Can't fingerprint {type(value).__qualname__} values")
+    else:
+        out.append(f"<{type(value).__module__}.{type(value).__qualname__}>")
+        _encode(vars(value), out)
+
+
+def fingerprint(ctx: Mapping[str, Any], paths: Sequence[str]) -> str:
+    """
+    A stable hash of the values at `paths` in `ctx`. Raises `Uncacheable` if
+    one of them can't be fingerprinted.
+    """
+    out: List[str] = []
+    for path in paths:
+        out.append(path)
+        value = lookup_path(ctx, path)
+        if value is UNDEFINED:
+            out.append("<missing>")
+        else:
+            try:
+                _encode(value, out)
+            except RecursionError:
+                raise Uncacheable(f"{path} is too deeply nested to fingerprint")
+    return hashlib.blake2b("\x00".join(out).encode("utf8"), digest_size=20).hexdigest()
@@ -0,0 +1,138 @@
+"""
+Coalescing of identical concurrent renders, so a spike of requests for the
+same page renders it once.
+"""
+
+import asyncio
+import threading
+from functools import partial
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+from ziggurat.exceptions import CoalescedRenderError
+from ziggurat.limits import RenderLimits
+from ziggurat.template import Template
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class RenderCoalescer:
+    """
+    Renders templates, sharing one in flight render (and its result or
+    error) between concurrent requests for the same template with the same
+    context. Contexts are compared by fingerprinting the paths the template
+    reads, as for `ziggurat.cache`; renders of contexts which can't be
+    fingerprinted are never shared.
+
+    `render` coalesces across threads, `render_async` across the tasks of an
+    event loop, running renders in `executor` (the loop's default if None).
+
+    When a shared render fails, the request which ran it raises the error and
+    the others a `CoalescedRenderError` chaining it, as one exception raised
+    from many threads at once would have its traceback rewritten by each.
+
+    - requests: renders asked for
+    - renders: renders actually run
+    - coalesced: requests given the result of another request's render
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.renders = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, "asyncio.Future[str]"] = {}
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        template: Template,
+        ctx: Mapping[str, Any],
+        limits: Optional[RenderLimits] = None,
+    ) -> Optional[Tuple[int, int, str]]:
+        """What identical renders have in common, None if it can't be known."""
+        cache_key = template.cache_key(ctx)
+        if cache_key is None:
+            return None
+        return id(template), id(limits), cache_key
+
+    def render(
+        self,
+        template: Template,
+        ctx: Mapping[str, Any],
+        limits: Optional[RenderLimits] = None,
+    ) -> str:
+        key = self.key(template, ctx, limits)
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key) if key is not None else None
+            if call is None:
+                self.renders += 1
+                if key is not None:
+                    self._calls[key] = leading = _Call()
+            else:
+                self.coalesced += 1
+
+        if call is not None:
+            call.done.wait()
+            if call.error is not None:
+                raise CoalescedRenderError(call.error) from call.error
+            return call.result  # type: ignore[return-value]
+
+        if key is None:
+            return template.render(ctx, limits)
+
+        call = leading
+        try:
+            call.result = template.render(ctx, limits)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def render_async(
+        self,
+        template: Template,
+        ctx: Mapping[str, Any],
+        limits: Optional[RenderLimits] = None,
+        executor: Any = None,
+    ) -> str:
+        loop = asyncio.get_running_loop()
+        key = self.key(template, ctx, limits)
+        loop_key = (id(loop), key)
+
+        with self._lock:
+            self.requests += 1
+            future = self._futures.get(loop_key) if key is not None else None
+            leading = future is None
+            if future is None:
+                self.renders += 1
+                future = loop.run_in_executor(executor, template.render, ctx, limits)
+                if key is not None:
+                    self._futures[loop_key] = future
+                    future.add_done_callback(partial(self._forget, loop_key))
+            else:
+                self.coalesced += 1
+
+        # a cancelled request mustn't cancel the render others are waiting on
+        if leading:
+            return await asyncio.shield(future)
+        try:
+            return await asyncio.shield(future)
+        except Exception as e:
+            raise CoalescedRenderError(e) from e
+
+    def _forget(self, key: Hashable, future: "asyncio.Future[str]"):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
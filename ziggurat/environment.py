@@ -0,0 +1,571 @@
+from __future__ import annotations
+
+import gc
+import hashlib
+import itertools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from ziggurat import ast
+from ziggurat.cache import RenderCache
+from ziggurat.exceptions import PreloadError, TemplateError
+from ziggurat.instrumentation import Instrumentation
+from ziggurat.limits import Budget, RenderLimits
+from ziggurat.markup import escape, safe
+from ziggurat.parser import Parser
+from ziggurat.undefined import STRICT, Policy, parse_policy
+from ziggurat.visitor import IncludeCollector, Renderer
+
+if TYPE_CHECKING:
+    from ziggurat.bundle import Bundle
+    from ziggurat.introspection import EnvironmentStats, WarmUpReport
+    from ziggurat.prefork import SharingReport
+    from ziggurat.template import Template
+
+Transform = Callable[[Any], Any]
+
+BUILTIN_TRANSFORMS: Dict[str, Transform] = {
+    "upper": str.upper,
+    "lower": str.lower,
+    "capitalize": str.capitalize,
+    "escape": escape,
+    "safe": safe,
+}
+
+# transforms which produce markup that autoescaping must leave alone
+BUILTIN_SAFE_TRANSFORMS = ("escape", "safe")
+# transforms whose result only depends on their argument
+BUILTIN_PURE_TRANSFORMS = tuple(BUILTIN_TRANSFORMS)
+
+_registry_ids = itertools.count()
+
+
+class TransformRegistry(Dict[str, Transform]):
+    """
+    A name -> transform mapping which tracks a `version` that changes on every
+    mutation. Templates resolve their transforms against a registry once, when
+    loaded, and compare versions before rendering to know when to rebind.
+
+    `safe` holds the names of transforms declared as producing safe markup,
+    and `pure` those declared to depend on nothing but their argument.
+
+    A frozen registry raises `TemplateError` on any mutation, see
+    `Environment.freeze`. `id` tells registries apart (it's unique within
+    the process) for render cache keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.id = next(_registry_ids)
+        self.version = 0
+        self.safe: Set[str] = set()
+        self.pure: Set[str] = set()
+        self.frozen = False
+
+    def freeze(self):
+        self.frozen = True
+
+    def mark_safe(self, names: Iterable[str]):
+        self._changing()
+        self.safe.update(names)
+        self._changed()
+
+    def mark_pure(self, names: Iterable[str]):
+        self._changing()
+        self.pure.update(names)
+        self._changed()
+
+    def _changing(self):
+        if self.frozen:
+            raise TemplateError("The transform registry is frozen")
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, name: str, func: Transform):
+        self._changing()
+        super().__setitem__(name, func)
+        self._changed()
+
+    def __delitem__(self, name: str):
+        self._changing()
+        super().__delitem__(name)
+        self._changed()
+
+    def pop(self, *args):
+        self._changing()
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        self._changing()
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def setdefault(self, name: str, default: Transform):  # type: ignore[override]
+        self._changing()
+        result = super().setdefault(name, default)
+        self._changed()
+        return result
+
+    def update(self, *args, **kwargs):
+        self._changing()
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def clear(self):
+        self._changing()
+        super().clear()
+        self._changed()
+
+
+class Environment:
+    """
+    Holds the configuration shared by a set of templates: the transform
+    registry, how templates are read and parsed, and a cache of the templates
+    loaded through it (includes included).
+
+    With a `search_path` of directories, templates are found by their path
+    relative to one of them, taking the first directory which has the file.
+    See `overlay`. A `bundle` (see `ziggurat.bundle`) is searched after them.
+    """
+
+    def __init__(
+        self,
+        transforms: Optional[Dict[str, Transform]] = None,
+        encoding: str = "utf8",
+        parser_cls: Type[Parser] = Parser,
+        renderer_cls: Type[Renderer] = Renderer,
+        instrumentation: Optional[Instrumentation] = None,
+        autoescape: bool = False,
+        limits: Optional[RenderLimits] = None,
+        render_cache: Optional[RenderCache] = None,
+        search_path: Iterable[Union[str, Path]] = (),
+        undefined: Policy = STRICT,
+        bundle: Union[str, Path, Bundle, None] = None,
+    ):
+        self.transforms = TransformRegistry(BUILTIN_TRANSFORMS)
+        self.transforms.mark_safe(BUILTIN_SAFE_TRANSFORMS)
+        self.transforms.mark_pure(BUILTIN_PURE_TRANSFORMS)
+        if transforms:
+            self.transforms.update(transforms)
+        self.encoding = encoding
+        self.parser_cls = parser_cls
+        self.renderer_cls = renderer_cls
+        # receives render events when set, see `ziggurat.instrumentation`
+        self.instrumentation = instrumentation
+        # HTML escape the output of lookups, see `ziggurat.markup`
+        self.autoescape = autoescape
+        # limits applied to every render, see `ziggurat.limits`
+        self.limits = limits
+        # opt in cache of whole renders, see `ziggurat.cache`
+        self.render_cache = render_cache
+        # how names missing from the context render, see `ziggurat.undefined`
+        parse_policy(undefined)
+        self.undefined = undefined
+        self.search_path = [Path(path).resolve() for path in search_path]
+        if bundle is not None and not hasattr(bundle, "load"):
+            from ziggurat.bundle import Bundle
+
+            bundle = Bundle(bundle)
+        self.bundle: Optional[Bundle] = bundle  # type: ignore[assignment]
+        self.templates: Dict[str, Template] = {}
+        # source -> the file it resolves to along the search path
+        self._resolved: Dict[str, str] = {}
+        # the parsed (not yet extended) tree of every file loaded, shared
+        # with overlays so each file is parsed once whichever loads it first
+        self._trees: Dict[str, ast.Block] = {}
+        # trees parsed ahead of time by `preload`, waiting to become templates
+        self._parsed: Dict[str, ast.Block] = {}
+        self._local = threading.local()
+        # the objects and pages of the templates when frozen
+        self._frozen_pages: Optional[Tuple[int, List[int]]] = None
+
+    def register_transform(
+        self,
+        func: Transform,
+        name: Optional[str] = None,
+        safe: bool = False,
+        pure: bool = False,
+    ) -> Transform:
+        """
+        Register `func` under `name`, defaulting to the function's name. Pass
+        `safe=True` if it returns markup autoescaping shouldn't escape, and
+        `pure=True` if its result depends only on its argument, so it can be
+        computed once for every iteration of a loop it doesn't depend on.
+        """
+        self.transforms._changing()
+        if name is None:
+            name = func.__name__
+        for flag, names in ((safe, self.transforms.safe), (pure, self.transforms.pure)):
+            if flag:
+                names.add(name)
+            else:
+                names.discard(name)
+        self.transforms[name] = func
+        return func
+
+    def overlay(
+        self,
+        *search_path: Union[str, Path],
+        render_cache: Optional[RenderCache] = None,
+    ) -> Environment:
+        """
+        An environment looking for templates in `search_path` before falling
+        back to this environment's search path. Everything but the render
+        cache is shared with this environment, including the parsed trees of
+        files found in the shared layers, so each overlay only parses (and
+        holds) the files it overrides.
+
+        Includes and `@extends@` of templates in the shared layers also look
+        in the overlay first, so overriding a file changes it everywhere.
+
+        As the transform registry is shared, transforms registered on (and
+        `freeze` of) any one of an environment and its overlays applies to
+        all of them.
+        """
+        overlay = Environment(
+            encoding=self.encoding,
+            parser_cls=self.parser_cls,
+            renderer_cls=self.renderer_cls,
+            instrumentation=self.instrumentation,
+            autoescape=self.autoescape,
+            limits=self.limits,
+            render_cache=render_cache,
+            undefined=self.undefined,
+            search_path=[*search_path, *self.search_path],
+            bundle=self.bundle,
+        )
+        overlay.transforms = self.transforms
+        overlay._trees = self._trees
+        return overlay
+
+    def resolve(self, source: Union[str, Path]) -> str:
+        """
+        The file `source` refers to. Without a search path (or bundle) it's
+        simply the resolved path. Otherwise relative paths, and paths within
+        one of the search path's directories, are looked up along the search
+        path and then in the bundle.
+        """
+        if not self.search_path and self.bundle is None:
+            return str(Path(source).resolve())
+
+        resolved = self._resolved.get(str(source))
+        if resolved is None:
+            resolved = self._resolved[str(source)] = self._search(Path(source))
+        return resolved
+
+    def _search(self, path: Path) -> str:
+        name: Optional[Path] = path
+        if path.is_absolute():
+            path = path.resolve()
+            name = None
+            roots = list(self.search_path)
+            if self.bundle is not None:
+                roots.append(self.bundle.root)
+            for directory in roots:
+                try:
+                    name = path.relative_to(directory)
+                    break
+                except ValueError:
+                    pass
+
+        if name is not None:
+            for directory in self.search_path:
+                candidate = directory / name
+                if candidate.is_file():
+                    return str(candidate)
+            if self.bundle is not None:
+                bundled = self.bundle.name(name)
+                if bundled is not None:
+                    return str(self.bundle.root / bundled)
+        return str(path.resolve())
+
+    def cache_namespace(self) -> str:
+        """
+        What, besides the template and context, a render depends on: the
+        transform registry, where templates are found (so overlays differ)
+        and how undefined names render. Part of the render cache key, so
+        environments can share a cache backend.
+        """
+        strict, value = parse_policy(self.undefined)
+        parts = [
+            str(self.transforms.id),
+            *map(str, self.search_path),
+            str(self.bundle.path.resolve()) if self.bundle is not None else "",
+            "strict" if strict else repr(value),
+        ]
+        return hashlib.blake2b(
+            "\x00".join(parts).encode("utf8"), digest_size=8
+        ).hexdigest()
+
+    def get_template(self, source: Union[str, Path]) -> Template:
+        from ziggurat.template import Template
+
+        key = self.resolve(source)
+        template = self.templates.get(key)
+        if template is None:
+            # templates being loaded by this thread, loading one again means
+            # it (indirectly) @extends@ itself
+            loading = self._local.__dict__.setdefault("loading", set())
+            if key in loading:
+                raise TemplateError(f"Circular @extends@ of {key}")
+
+            loading.add(key)
+            start = time.perf_counter()
+            try:
+                template = Template(
+                    key,
+                    encoding=self.encoding,
+                    parser_cls=self.parser_cls,
+                    renderer_cls=self.renderer_cls,
+                    environment=self,
+                    tree=self._tree(key),
+                )
+            finally:
+                loading.discard(key)
+            # including the time to read and parse the file, done here
+            template.load_seconds = time.perf_counter() - start
+            self.templates[key] = template
+        return template
+
+    def _tree(self, key: str) -> ast.Block:
+        # trees parsed ahead of time by `preload` are only needed once
+        parsed = self._parsed.pop(key, None)
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = parsed or self._bundled_tree(key)
+            if tree is None:
+                with open(key, "r", encoding=self.encoding) as tmpl:
+                    tree = self.parser_cls(tmpl.read()).parse()
+            self._trees[key] = tree
+        return tree
+
+    def _bundled_tree(self, key: str) -> Optional[ast.Block]:
+        if self.bundle is None:
+            return None
+        name = self.bundle.name(Path(key))
+        return self.bundle.load(name) if name is not None else None
+
+    def preload(
+        self,
+        root: Union[str, Path],
+        pattern: str = "**/*",
+        workers: Optional[int] = None,
+    ) -> PreloadReport:
+        """
+        Load every file under `root` matching `pattern`, parsing them in a pool
+        of `workers` processes (one per CPU by default). Rather than stopping
+        at the first error, the errors of all files (including `@include@`s of
+        files which don't exist) are collected into the returned report.
+        """
+        start = time.perf_counter()
+        root = Path(root).resolve()
+        paths = sorted(str(path) for path in root.glob(pattern) if path.is_file())
+        report = PreloadReport(root)
+
+        parsed = parse_files(paths, self.encoding, self.parser_cls, workers)
+        for path, tree, error, seconds in parsed:
+            report.times[report.name(path)] = seconds
+            if error is not None:
+                report.errors[report.name(path)] = error
+            elif tree is not None and path not in self.templates:
+                self._parsed[path] = tree
+
+        for path in paths:
+            name = report.name(path)
+            if name in report.errors:
+                continue
+
+            load_start = time.perf_counter()
+            try:
+                template = self.get_template(path)
+            except Exception as e:
+                report.errors[name] = f"{type(e).__name__}: {e}"
+                continue
+            finally:
+                self._parsed.pop(path, None)
+                report.times[name] += time.perf_counter() - load_start
+
+            missing = self._missing_includes(template)
+            if missing:
+                report.errors[name] = "Missing @include@: " + ", ".join(missing)
+            else:
+                report.templates[name] = template
+
+        report.total = time.perf_counter() - start
+        return report
+
+    def _missing_includes(self, template: Template) -> List[str]:
+        collector = IncludeCollector()
+        template.ast.accept(collector)
+        base = template.source.parent
+        missing = []
+        for include in collector.includes:
+            # found the way rendering finds it, along the search path and in
+            # the bundle
+            path = Path(self.resolve(base / include.source))
+            if path.is_file():
+                continue
+            if self.bundle is not None and self.bundle.name(path) is not None:
+                continue
+            missing.append(include.source)
+        return missing
+
+    def warm_up(
+        self,
+        sources: Iterable[Union[str, Path]],
+        contexts: Optional[Mapping[str, Iterable[Mapping[str, Any]]]] = None,
+    ) -> WarmUpReport:
+        """
+        Load the templates at `sources` and render each with its sample
+        contexts in `contexts` (by the same source), so the first real
+        requests don't pay for parsing and analyzing them. The output is
+        thrown away and never cached. As with `preload`, errors are collected
+        into the returned report rather than raised.
+        """
+        from ziggurat.introspection import WarmUpReport
+
+        start = time.perf_counter()
+        report = WarmUpReport()
+        contexts = contexts or {}
+        for source in sources:
+            name = str(source)
+            try:
+                template = self.get_template(source)
+                if self.render_cache is not None:
+                    template.context_paths()
+                for ctx in contexts.get(name, ()):
+                    budget = Budget(self.limits) if self.limits is not None else None
+                    template.render_into(ctx, [], budget)
+                    report.renders += 1
+            except Exception as e:
+                report.errors[name] = f"{type(e).__name__}: {e}"
+            else:
+                report.templates[name] = template
+
+        report.total = time.perf_counter() - start
+        return report
+
+    def stats(self) -> EnvironmentStats:
+        """
+        A snapshot of the loaded templates (with their load times, sizes and
+        render counts) and of the render cache and transform use.
+        """
+        from ziggurat.introspection import EnvironmentStats
+
+        return EnvironmentStats(self)
+
+    def freeze(self):
+        """
+        Prepare the templates loaded so far to be shared by processes forked
+        from this one. Everything rendering would otherwise compute lazily
+        (and write into the trees) is done now, the transform registry is
+        frozen so templates never need rebinding, and every object is moved
+        out of reach of the garbage collector with `gc.freeze`, so collections
+        in the children don't write to (and so copy) the pages holding them.
+
+        Call it last thing before forking. Reference counting still writes to
+        the objects a render touches, see `sharing_report` to measure how
+        much stays shared.
+
+        Overlays share their parent's transform registry, so freezing any
+        environment freezes the registry of its parent and every overlay
+        too. Only this environment's templates are prepared though, call
+        `freeze` on each overlay whose templates should be as well.
+        """
+        from ziggurat.prefork import tree_pages
+
+        for template in list(self.templates.values()):
+            if self.render_cache is not None:
+                template.context_paths()
+        for template in list(self.templates.values()):
+            template.bind()
+        self.transforms.freeze()
+
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+        self._frozen_pages = tree_pages(self.templates.values())
+
+    def sharing_report(self) -> SharingReport:
+        """
+        How much of the memory of the loaded templates is shared, measuring
+        the templates frozen by `freeze` if it was called.
+        """
+        from ziggurat.prefork import sharing_report, tree_pages
+
+        pages = self._frozen_pages or tree_pages(self.templates.values())
+        return sharing_report(*pages)
+
+
+class PreloadReport:
+    def __init__(self, root: Path):
+        self.root = root
+        # by path relative to root
+        self.templates: Dict[str, Template] = {}
+        self.errors: Dict[str, str] = {}
+        self.times: Dict[str, float] = {}
+        self.total = 0.0
+
+    def name(self, path: str) -> str:
+        return Path(path).relative_to(self.root).as_posix()
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def check(self):
+        """Raise a `PreloadError` listing every error, if there were any."""
+        if self.errors:
+            raise PreloadError(self.errors)
+
+
+def parse_files(
+    paths: List[str],
+    encoding: str,
+    parser_cls: Type[Parser],
+    workers: Optional[int] = None,
+) -> List[Tuple[str, Optional[ast.Block], Optional[str], float]]:
+    """
+    Parse the files at `paths` in a pool of `workers` processes, returning
+    the path, tree (or error) and time taken of each, in order.
+    """
+    args = [(path, encoding, parser_cls) for path in paths]
+    if workers == 1 or len(paths) <= 1:
+        return [_parse_file(*arg) for arg in args]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_parse_file, *zip(*args), chunksize=8))
+
+
+def _parse_file(
+    path: str, encoding: str, parser_cls: Type[Parser]
+) -> Tuple[str, Optional[ast.Block], Optional[str], float]:
+    start = time.perf_counter()
+    try:
+        with open(path, "r", encoding=encoding) as tmpl:
+            tree = parser_cls(tmpl.read()).parse()
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+    return path, tree, None, time.perf_counter() - start
+
+
+default_environment = Environment()
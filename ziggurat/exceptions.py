@@ -0,0 +1,63 @@
+from typing import Any, Dict, Iterable, Optional
+
+
+class TemplateError(Exception):
+    """Base class for errors raised while loading or rendering a template."""
+
+
+class UnknownTransformError(TemplateError):
+    def __init__(self, names: Iterable[str], template: Optional[str] = None):
+        self.names = sorted(set(names))
+        self.template = template
+
+        where = f" in {template}" if template else ""
+        super().__init__(f"Unknown transform(s){where}: {', '.join(self.names)}")
+
+
+class RenderLimitExceeded(TemplateError):
+    def __init__(
+        self, limit: str, value: Any, template: str, lineno: Optional[int] = None
+    ):
+        self.limit = limit
+        self.value = value
+        self.template = template
+        self.lineno = lineno
+
+        location = f"{template}:{lineno if lineno is not None else '?'}"
+        super().__init__(f"Render exceeded {limit}={value} at {location}")
+
+
+class PreloadError(TemplateError):
+    def __init__(self, errors: Dict[str, str]):
+        self.errors = errors
+
+        lines = [f"{len(errors)} template(s) failed to load:"]
+        lines.extend(f"  {name}: {error}" for name, error in sorted(errors.items()))
+        super().__init__("\n".join(lines))
+
+
+class UndefinedError(TemplateError, KeyError):
+    def __init__(self, name: str, template: str, lineno: Optional[int] = None):
+        self.name = name
+        self.template = template
+        self.lineno = lineno
+
+        location = f"{template}:{lineno if lineno is not None else '?'}"
+        super().__init__(f"{name!r} is undefined at {location}")
+
+    def __str__(self) -> str:
+        # KeyError would show the repr of the message
+        return str(self.args[0])
+
+
+class CoalescedRenderError(TemplateError):
+    """
+    Raised to the requests given the result of another request's render,
+    see `ziggurat.coalesce`, when that render failed. `error` is the original
+    exception, also chained as the cause, which the request whose render it
+    was raises itself.
+    """
+
+    def __init__(self, error: BaseException):
+        self.error = error
+        super().__init__(f"Coalesced render failed: {type(error).__name__}: {error}")
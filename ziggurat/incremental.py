@@ -0,0 +1,162 @@
+"""
+Incremental rendering, re-rendering only the parts of a template whose
+context changed since the last render.
+"""
+
+from __future__ import annotations
+
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from ziggurat import ast
+from ziggurat.analysis import ContextPaths
+from ziggurat.limits import Budget
+
+if TYPE_CHECKING:
+    from ziggurat.template import Template
+
+
+class Change(NamedTuple):
+    """
+    The bytes `start` to `end` of the previous output were replaced by `text`.
+    """
+
+    start: int
+    end: int
+    text: str
+
+
+class Segment:
+    __slots__ = ("node", "paths", "text", "size")
+
+    def __init__(self, node: ast.AST, paths: Optional[List[str]]):
+        self.node = node
+        # None when the paths the node reads aren't known, so any change may
+        # affect it
+        self.paths = paths
+        self.text = ""
+        self.size = 0
+
+    def affected_by(self, changed: List[str]) -> bool:
+        if self.paths is None:
+            return True
+        return any(_overlaps(path, name) for path in self.paths for name in changed)
+
+
+def _overlaps(path: str, changed: str) -> bool:
+    return (
+        path == changed
+        or path.startswith(changed + ".")
+        or changed.startswith(path + ".")
+    )
+
+
+def _segment_nodes(block: ast.Block) -> Iterator[ast.AST]:
+    # sections always render their body, so their children can be segments
+    for node in block.nodes:
+        if isinstance(node, ast.Section):
+            yield from _segment_nodes(node.body)
+        else:
+            yield node
+
+
+def _assign(ctx: Dict[str, Any], path: str, value: Any):
+    head, _, rest = path.partition(".")
+    if not rest:
+        ctx[head] = value
+        return
+
+    child = ctx.get(head)
+    if not isinstance(child, dict):
+        raise TypeError(f"Can't assign {path!r}, {head!r} is not a dict")
+    # copied so the dicts of the context the render was started with are
+    # never modified
+    child = ctx[head] = dict(child)
+    _assign(child, rest, value)
+
+
+class IncrementalRender:
+    """
+    A render of `template` that can be updated with changes to its context.
+
+    The template's top level nodes (and those of its blocks) are rendered
+    separately, remembering each one's output and the context paths it reads.
+    `update` then only re-renders the nodes reading a changed path. Offsets
+    of changes are in bytes of the output encoded with `encoding`.
+    """
+
+    def __init__(
+        self, template: Template, ctx: Mapping[str, Any], encoding: str = "utf8"
+    ):
+        self.template = template
+        self.encoding = encoding
+        self.context: Dict[str, Any] = dict(ctx)
+        self.segments: List[Segment] = []
+        self.macros: Dict[str, Tuple[List[str], ast.Block]] = {}
+
+        environment = template.environment
+        for node in _segment_nodes(template.ast):
+            collector = ContextPaths(environment.get_template, template.source.parent)
+            node.accept(collector)
+            paths = collector.minimal() if collector.complete else None
+            self.segments.append(Segment(node, paths))
+
+        self._render(self.segments)
+
+    @property
+    def result(self) -> str:
+        return "".join(segment.text for segment in self.segments)
+
+    def update(self, changes: Mapping[str, Any]) -> List[Change]:
+        """
+        Apply `changes`, a mapping of dotted context paths to their new
+        values, and re-render the affected nodes. Returns the changed ranges
+        of the output, as offsets into the previous output.
+        """
+        for path, value in changes.items():
+            _assign(self.context, path, value)
+
+        changed = list(changes)
+        affected = [
+            segment for segment in self.segments if segment.affected_by(changed)
+        ]
+        previous = {id(segment): segment.text for segment in affected}
+        self._render(affected)
+
+        result: List[Change] = []
+        offset = 0
+        for segment in self.segments:
+            old = previous.get(id(segment))
+            if old is not None and old != segment.text:
+                old_size = len(old.encode(self.encoding))
+                last = result[-1] if result else None
+                if last is not None and last.end == offset:
+                    result[-1] = Change(
+                        last.start, offset + old_size, last.text + segment.text
+                    )
+                else:
+                    result.append(Change(offset, offset + old_size, segment.text))
+                offset += old_size
+            else:
+                offset += segment.size
+        return result
+
+    def _render(self, segments: List[Segment]):
+        limits = self.template.environment.limits
+        budget = Budget(limits) if limits is not None else None
+        for segment in segments:
+            sink: List[str] = []
+            renderer = self.template.renderer(self.context, budget, sink)
+            renderer.macros = self.macros
+            segment.node.accept(renderer)
+            segment.text = "".join(sink)
+            segment.size = len(segment.text.encode(self.encoding))
@@ -0,0 +1,93 @@
+"""
+Resolves `@extends base@` when a template is loaded, merging the inheritance
+chain into a single tree so rendering never has to look up a parent.
+"""
+
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, TypeVar
+
+from ziggurat import ast
+from ziggurat.exceptions import TemplateError
+
+if TYPE_CHECKING:
+    from ziggurat.template import Template
+
+Node = TypeVar("Node", bound=ast.AST)
+
+
+def extend(tree: ast.Block, load: Callable[[str], Template]) -> ast.Block:
+    """
+    If `tree` extends another template, return that template's (already
+    flattened) tree with its sections replaced by the ones `tree` overrides.
+    Macros defined at the top level of `tree` are kept, the rest of it is
+    dropped. `load` returns the template for an `@extends@` source.
+    """
+    extends = [node for node in tree.nodes if isinstance(node, ast.Extends)]
+    if not extends:
+        return tree
+    if len(extends) > 1:
+        raise TemplateError("A template can only @extends@ one other template")
+
+    parent = load(extends[0].source)
+
+    overrides: Dict[str, ast.Section] = {}
+    _collect_sections(tree.nodes, overrides)
+    macros: List[ast.AST] = [node for node in tree.nodes if isinstance(node, ast.Macro)]
+
+    flattened = _substitute(parent.ast, overrides, parent.source.parent)
+    return ast.Block(macros + flattened.nodes)
+
+
+def _collect_sections(nodes: List[ast.AST], sections: Dict[str, ast.Section]):
+    for node in nodes:
+        if isinstance(node, ast.Section):
+            sections[node.name] = node
+            _collect_sections(node.body.nodes, sections)
+
+
+def _substitute(node: Node, overrides: Dict[str, ast.Section], base: Path) -> Node:
+    """
+    Replace overridden sections under `node`. Includes are made relative to
+    `base`, the parent's directory, as they're rendered from the child's.
+    Untouched subtrees are shared with the parent rather than copied.
+    """
+    if isinstance(node, ast.Section):
+        override = overrides.get(node.name)
+        if override is not None:
+            return override  # type: ignore[return-value]
+        return _replace(node, "body", overrides, base)
+
+    if isinstance(node, ast.Include):
+        include = copy.copy(node)
+        include.source = str(base / node.source)
+        return include
+
+    if isinstance(node, ast.Block):
+        nodes = [_substitute(child, overrides, base) for child in node.nodes]
+        if all(new is old for new, old in zip(nodes, node.nodes)):
+            return node
+        block = copy.copy(node)
+        block.nodes = nodes
+        return block
+
+    if isinstance(node, ast.If):
+        node = _replace(node, "consequence", overrides, base)
+        return _replace(node, "alternative", overrides, base)
+
+    if isinstance(node, (ast.For, ast.Macro)):
+        return _replace(node, "body", overrides, base)
+
+    return node
+
+
+def _replace(node: Node, attr: str, overrides: Dict[str, ast.Section], base: Path):
+    child = getattr(node, attr)
+    new_child = _substitute(child, overrides, base)
+    if new_child is child:
+        return node
+    node = copy.copy(node)
+    setattr(node, attr, new_child)
+    return node
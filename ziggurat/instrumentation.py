@@ -0,0 +1,197 @@
+import os
+import re
+import socket
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+
+class Instrumentation:
+    """
+    Receives events from renders in an environment. Every hook is a no-op
+    here; subclass and override the ones you need. `template` is the path of
+    the template being rendered, and the `size` of a render's output is in
+    characters (encoding it to count bytes would cost every render).
+
+    Hooks are called from whichever thread is rendering, so implementations
+    must be thread safe.
+    """
+
+    def render_start(self, template: str):
+        pass
+
+    def render_end(
+        self,
+        template: str,
+        seconds: float,
+        size: int,
+        error: Optional[BaseException] = None,
+    ):
+        pass
+
+    def include(self, template: str, source: str):
+        pass
+
+    def macro(self, template: str, name: str):
+        pass
+
+    def transform(self, template: str, name: str):
+        pass
+
+
+# upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+class TemplateStats:
+    def __init__(self):
+        self.renders = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.output_chars = 0
+        self.includes = 0
+        self.macros = 0
+        self.transforms: Dict[str, int] = {}
+        # one count per bucket in LATENCY_BUCKETS plus one for anything slower
+        self.latency_histogram: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "renders": self.renders,
+            "errors": self.errors,
+            "seconds": self.seconds,
+            "output_chars": self.output_chars,
+            "includes": self.includes,
+            "macros": self.macros,
+            "transforms": dict(self.transforms),
+            "latency_histogram": list(self.latency_histogram),
+        }
+
+
+class MemoryAggregator(Instrumentation):
+    """Aggregates render metrics per template in memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.templates: Dict[str, TemplateStats] = {}
+
+    def _stats(self, template: str) -> TemplateStats:
+        stats = self.templates.get(template)
+        if stats is None:
+            stats = self.templates.setdefault(template, TemplateStats())
+        return stats
+
+    def render_end(
+        self,
+        template: str,
+        seconds: float,
+        size: int,
+        error: Optional[BaseException] = None,
+    ):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds * 1000)
+        with self._lock:
+            stats = self._stats(template)
+            stats.renders += 1
+            stats.seconds += seconds
+            stats.output_chars += size
+            stats.latency_histogram[bucket] += 1
+            if error is not None:
+                stats.errors += 1
+
+    def include(self, template: str, source: str):
+        with self._lock:
+            self._stats(template).includes += 1
+
+    def macro(self, template: str, name: str):
+        with self._lock:
+            self._stats(template).macros += 1
+
+    def transform(self, template: str, name: str):
+        with self._lock:
+            transforms = self._stats(template).transforms
+            transforms[name] = transforms.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self.templates.items()}
+
+    def reset(self):
+        with self._lock:
+            self.templates.clear()
+
+
+class StatsdEmitter(Instrumentation):
+    """
+    Sends render metrics over UDP using the statsd line protocol, e.g.
+    `ziggurat.users.index.render:1|c`. Templates are named by `naming`,
+    which defaults to their path relative to `root` (the working directory
+    by default) without its suffix, with `.` between directories.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8125,
+        prefix: str = "ziggurat",
+        root: Union[str, Path, None] = None,
+        naming: Optional[Callable[[str], str]] = None,
+    ):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.root = Path(root if root is not None else os.getcwd()).resolve()
+        self.naming = naming or self.template_name
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # template -> metric name, as every event needs one
+        self._names: Dict[str, str] = {}
+
+    def template_name(self, template: str) -> str:
+        path = Path(template)
+        try:
+            path = path.relative_to(self.root)
+        except ValueError:
+            # outside of root, named by its whole path
+            path = Path(*path.parts[1:]) if path.is_absolute() else path
+        parts = [*path.parent.parts, path.stem]
+        return ".".join(re.sub(r"[^A-Za-z0-9_]", "_", part) for part in parts)
+
+    def metric(self, template: str, name: str) -> str:
+        metric = self._names.get(template)
+        if metric is None:
+            metric = self._names[template] = f"{self.prefix}.{self.naming(template)}"
+        return f"{metric}.{name}"
+
+    def send(self, *lines: str):
+        try:
+            self.socket.sendto("\n".join(lines).encode("utf8"), self.address)
+        except OSError:
+            # metrics are best effort, never fail a render over them
+            pass
+
+    def render_end(
+        self,
+        template: str,
+        seconds: float,
+        size: int,
+        error: Optional[BaseException] = None,
+    ):
+        lines = [
+            f"{self.metric(template, 'render')}:1|c",
+            f"{self.metric(template, 'render_time')}:{seconds * 1000:.3f}|ms",
+            f"{self.metric(template, 'output_chars')}:{size}|h",
+        ]
+        if error is not None:
+            lines.append(f"{self.metric(template, 'error')}:1|c")
+        self.send(*lines)
+
+    def include(self, template: str, source: str):
+        self.send(f"{self.metric(template, 'include')}:1|c")
+
+    def macro(self, template: str, name: str):
+        self.send(f"{self.metric(template, 'macro')}:1|c")
+
+    def transform(self, template: str, name: str):
+        self.send(f"{self.metric(template, 'transform')}.{name}:1|c")
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,125 @@
+"""
+The state of an environment's loaded templates and caches, to tell which
+templates are still cold (and warm them up before taking traffic), see
+`Environment.stats` and `Environment.warm_up`.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from ziggurat.analysis import NodeCounter
+from ziggurat.cache import LRUCache
+from ziggurat.exceptions import PreloadError
+from ziggurat.instrumentation import MemoryAggregator
+
+if TYPE_CHECKING:
+    from ziggurat.environment import Environment
+    from ziggurat.template import Template
+
+
+class TemplateInfo:
+    """
+    A loaded template: how long it took to load, the number of nodes of its
+    tree (after `@extends@` is resolved) and how often it has been rendered.
+    """
+
+    def __init__(self, template: Template):
+        counter = NodeCounter()
+        template.ast.accept(counter)
+        self.source = str(template.source)
+        self.load_seconds = template.load_seconds
+        self.nodes = counter.total
+        self.renders = template.renders
+        self.cache_hits = template.cache_hits
+
+    @property
+    def warm(self) -> bool:
+        """Whether the template has been rendered, or served from the cache."""
+        return self.renders > 0 or self.cache_hits > 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "load_seconds": self.load_seconds,
+            "nodes": self.nodes,
+            "renders": self.renders,
+            "cache_hits": self.cache_hits,
+        }
+
+
+class EnvironmentStats:
+    """
+    A snapshot of an environment:
+
+    - templates: a `TemplateInfo` per loaded template, by source
+    - render_cache: the size, hits and misses of the render cache, if it's an
+      `LRUCache` (other backends are opaque)
+    - transforms: the transforms registered, with the number of times each
+      was applied if the environment's instrumentation is a
+      `MemoryAggregator`, None otherwise
+    - includes: includes rendered, of each template, by the same measure
+    """
+
+    def __init__(self, environment: Environment):
+        self.templates: Dict[str, TemplateInfo] = {
+            source: TemplateInfo(template)
+            for source, template in list(environment.templates.items())
+        }
+
+        self.render_cache: Optional[Dict[str, int]] = None
+        cache = environment.render_cache
+        if isinstance(cache, LRUCache):
+            self.render_cache = {
+                "size": len(cache),
+                "hits": cache.hits,
+                "misses": cache.misses,
+            }
+
+        instrumentation = environment.instrumentation
+        counted = isinstance(instrumentation, MemoryAggregator)
+        self.transforms: Dict[str, Optional[int]] = dict.fromkeys(
+            environment.transforms, 0 if counted else None
+        )
+        self.includes: Optional[Dict[str, int]] = None
+        if isinstance(instrumentation, MemoryAggregator):
+            self.includes = {}
+            for source, stats in instrumentation.snapshot().items():
+                self.includes[source] = stats["includes"]
+                for name, count in stats["transforms"].items():
+                    self.transforms[name] = (self.transforms.get(name) or 0) + count
+
+    @property
+    def cold(self) -> List[str]:
+        """The sources of the templates which were never rendered."""
+        return sorted(
+            source for source, info in self.templates.items() if not info.warm
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "templates": {
+                source: info.as_dict() for source, info in self.templates.items()
+            },
+            "render_cache": self.render_cache,
+            "transforms": dict(self.transforms),
+            "includes": self.includes,
+        }
+
+
+class WarmUpReport:
+    def __init__(self):
+        # by the source given to `warm_up`
+        self.templates: Dict[str, Template] = {}
+        self.errors: Dict[str, str] = {}
+        self.renders = 0
+        self.total = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def check(self):
+        """Raise a `PreloadError` listing every error, if there were any."""
+        if self.errors:
+            raise PreloadError(self.errors)
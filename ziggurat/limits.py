@@ -0,0 +1,95 @@
+import time
+from typing import Optional
+
+from ziggurat import ast
+from ziggurat.exceptions import RenderLimitExceeded
+
+
+class RenderLimits:
+    """
+    Per render limits, any left as `None` are unlimited. Going over one raises
+    `RenderLimitExceeded` with the template and line being rendered.
+
+    - max_output: characters of output
+    - max_iterations: `@for@` iterations, across all loops
+    - max_recursion: depth of nested macro calls
+    - max_include_depth: depth of nested `@include@`s
+    - timeout: seconds of wall time, checked at loop iterations and calls
+    """
+
+    def __init__(
+        self,
+        max_output: Optional[int] = None,
+        max_iterations: Optional[int] = None,
+        max_recursion: Optional[int] = None,
+        max_include_depth: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.max_output = max_output
+        self.max_iterations = max_iterations
+        self.max_recursion = max_recursion
+        self.max_include_depth = max_include_depth
+        self.timeout = timeout
+
+
+class Budget:
+    """
+    What a single render has used of its `RenderLimits`, shared by the
+    renderers of its macro calls and includes.
+    """
+
+    # loop iterations between checks of the clock
+    CLOCK_INTERVAL = 64
+
+    def __init__(self, limits: RenderLimits):
+        self.limits = limits
+        self.output = 0
+        self.iterations = 0
+        self.macro_depth = 0
+        self.include_depth = 0
+        self.deadline: Optional[float] = None
+        if limits.timeout is not None:
+            self.deadline = time.monotonic() + limits.timeout
+
+    def exceeded(self, limit: str, template: str, node: ast.AST):
+        raise RenderLimitExceeded(
+            limit, getattr(self.limits, limit), template, node.lineno
+        )
+
+    def check_time(self, template: str, node: ast.AST):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded("timeout", template, node)
+
+    def write(self, size: int, template: str, node: ast.AST):
+        self.output += size
+        max_output = self.limits.max_output
+        if max_output is not None and self.output > max_output:
+            self.exceeded("max_output", template, node)
+
+    def iterate(self, template: str, node: ast.AST):
+        self.iterations += 1
+        max_iterations = self.limits.max_iterations
+        if max_iterations is not None and self.iterations > max_iterations:
+            self.exceeded("max_iterations", template, node)
+        if self.iterations % self.CLOCK_INTERVAL == 0:
+            self.check_time(template, node)
+
+    def enter_macro(self, template: str, node: ast.AST):
+        self.macro_depth += 1
+        max_recursion = self.limits.max_recursion
+        if max_recursion is not None and self.macro_depth > max_recursion:
+            self.exceeded("max_recursion", template, node)
+        self.check_time(template, node)
+
+    def exit_macro(self):
+        self.macro_depth -= 1
+
+    def enter_include(self, template: str, node: ast.AST):
+        self.include_depth += 1
+        max_include_depth = self.limits.max_include_depth
+        if max_include_depth is not None and self.include_depth > max_include_depth:
+            self.exceeded("max_include_depth", template, node)
+        self.check_time(template, node)
+
+    def exit_include(self):
+        self.include_depth -= 1
@@ -0,0 +1,312 @@
+"""
+Static checks for template patterns which are slow (or surprising) to render.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+
+from ziggurat import ast
+from ziggurat.environment import BUILTIN_PURE_TRANSFORMS
+from ziggurat.parser import Parser
+from ziggurat.visitor import NodeVisitor
+
+SEVERITIES = ("info", "warning", "error")
+
+# rough costs, in node visits, used to estimate the work of a loop iteration
+TEXT_COST = 1
+LOOKUP_COST = 1  # plus one per `.` part
+TRANSFORM_COST = 2
+INCLUDE_COST = 2  # after the first render includes are copied from a cache
+CALL_COST = 2  # plus the macro's body
+# iterations assumed for loops nested in the loop being estimated
+ASSUMED_ITERATIONS = 10
+
+# lookups with at least this many parts are worth binding outside a loop
+DEEP_LOOKUP = 3
+
+
+class Finding(NamedTuple):
+    template: str
+    lineno: Optional[int]
+    severity: str
+    code: str
+    message: str
+    # estimated node visits per loop iteration, for findings about a loop
+    cost: Optional[int] = None
+
+    def __str__(self) -> str:
+        lineno = self.lineno if self.lineno is not None else "?"
+        cost = f" (~{self.cost} per iteration)" if self.cost is not None else ""
+        return f"{self.template}:{lineno}: {self.severity} {self.code}: {self.message}{cost}"
+
+
+class Linter(NodeVisitor):
+    """
+    Walks a single template's tree collecting `findings`:
+
+    - loop-cost: the estimated cost of every loop iteration, a warning from
+      `max_cost` on
+    - include-in-loop: includes are rendered once per render and repeated
+      from a cache, so they see the loop variables of the first iteration
+    - deep-lookup-in-loop: dotted lookups of `DEEP_LOOKUP` or more parts in a
+      loop body, a warning if the same one is repeated
+    - invariant-transform: transforms of a value which doesn't depend on the
+      loop, recomputed every iteration as they aren't all in `pure`
+    - unguarded-recursion: macros calling themselves (directly or through
+      other macros) outside of an `@if@` or `@for@`, which never terminate.
+      A loop ends the recursion once its iterable is empty, e.g. a tree
+      macro recursing over `node.children`
+    """
+
+    def __init__(
+        self,
+        template: str,
+        max_cost: int = 50,
+        pure: Iterable[str] = BUILTIN_PURE_TRANSFORMS,
+    ):
+        self.template = template
+        self.max_cost = max_cost
+        self.pure = set(pure)
+        self.findings: List[Finding] = []
+        self.macros: Dict[str, ast.Macro] = {}
+        self._loops: List[ast.For] = []
+        # dotted lookups of each loop being walked, by path
+        self._lookups: List[Dict[str, List[Optional[int]]]] = []
+        self._macro: Optional[ast.Macro] = None
+        self._guards = 0
+        # macro -> the macros it calls, and whether the call is in an @if@
+        # or @for@ (either of which can end a recursion)
+        self._calls: Dict[str, List[Tuple[str, bool, Optional[int]]]] = {}
+        self._lineno: Optional[int] = None
+
+    def lint(self, tree: ast.Block) -> List[Finding]:
+        self.macros.update(
+            (node.name, node) for node in tree.nodes if isinstance(node, ast.Macro)
+        )
+        tree.accept(self)
+        self._check_recursion()
+        self.findings.sort(key=lambda f: (f.lineno or 0, f.code))
+        return self.findings
+
+    def add(
+        self,
+        lineno: Optional[int],
+        severity: str,
+        code: str,
+        message: str,
+        cost: Optional[int] = None,
+    ):
+        self.findings.append(
+            Finding(self.template, lineno, severity, code, message, cost)
+        )
+
+    def _located(self, node: ast.AST) -> Optional[int]:
+        if node.lineno is not None:
+            self._lineno = node.lineno
+        return self._lineno
+
+    def visit_if(self, node: ast.If):
+        self._located(node)
+        self._lookup(node.condition, [], node.lineno)
+        self._guards += 1
+        try:
+            super().visit_if(node)
+        finally:
+            self._guards -= 1
+
+    def visit_for(self, node: ast.For):
+        lineno = self._located(node)
+        self._lookup(node.iterator, [], lineno)
+
+        cost = self.cost(node.body)
+        if cost >= self.max_cost:
+            self.add(
+                lineno,
+                "warning",
+                "loop-cost",
+                f"iterations over {node.iterator} are expensive",
+                cost,
+            )
+        else:
+            self.add(lineno, "info", "loop-cost", f"loop over {node.iterator}", cost)
+
+        self._loops.append(node)
+        self._lookups.append({})
+        self._guards += 1
+        try:
+            node.body.accept(self)
+        finally:
+            self._guards -= 1
+            self._loops.pop()
+            lookups = self._lookups.pop()
+
+        for path, linenos in sorted(lookups.items()):
+            repeated = len(linenos) > 1
+            self.add(
+                linenos[0],
+                "warning" if repeated else "info",
+                "deep-lookup-in-loop",
+                f"{path} is looked up {len(linenos)} time(s) per iteration of "
+                f"{node.iterator}, consider flattening it in the context",
+            )
+
+    def visit_include(self, node: ast.Include):
+        lineno = self._located(node)
+        if self._loops:
+            self.add(
+                lineno,
+                "warning",
+                "include-in-loop",
+                f"{node.source} is rendered once per render and repeated from a "
+                "cache, with the loop variables of the first iteration",
+            )
+
+    def visit_macro(self, node: ast.Macro):
+        self._located(node)
+        outer, loops, lookups, guards = (
+            self._macro,
+            self._loops,
+            self._lookups,
+            self._guards,
+        )
+        # a macro body is walked as it's defined, not where it's called
+        self._macro, self._loops, self._lookups, self._guards = node, [], [], 0
+        self._calls.setdefault(node.name, [])
+        try:
+            super().visit_macro(node)
+        finally:
+            self._macro, self._loops, self._lookups, self._guards = (
+                outer,
+                loops,
+                lookups,
+                guards,
+            )
+
+    def visit_lookup(self, node: ast.Lookup):
+        self._lookup(node.name, node.transforms, self._located(node))
+
+    def visit_call(self, node: ast.Call):
+        self._located(node)
+        if self._macro is not None:
+            self._calls[self._macro.name].append(
+                (node.name, self._guards > 0, self._lineno)
+            )
+        super().visit_call(node)
+
+    def _lookup(self, path: str, transforms: List[str], lineno: Optional[int]):
+        if not self._loops:
+            return
+
+        parts = path.split(".")
+        if len(parts) >= DEEP_LOOKUP:
+            self._lookups[-1].setdefault(path, []).append(lineno)
+
+        impure = [transform for transform in transforms if transform not in self.pure]
+        if impure and parts[0] not in {loop.name for loop in self._loops}:
+            # lookups with only pure transforms are hoisted out of the loop
+            self.add(
+                lineno,
+                "warning",
+                "invariant-transform",
+                f"{' | '.join(transforms)} of {path} doesn't depend on the loop "
+                f"but is recomputed every iteration, as {', '.join(impure)} "
+                "isn't registered as pure",
+            )
+
+    def _check_recursion(self):
+        # a cycle of calls none of which are behind an @if@ can never end
+        reported: Set[str] = set()
+        for name in sorted(self._calls):
+            cycle = self._unguarded_cycle(name, name, [])
+            if cycle is not None and name not in reported:
+                reported.update(cycle)
+                path = " -> ".join([*cycle, name])
+                self.add(
+                    self.macros[name].lineno if name in self.macros else None,
+                    "error",
+                    "unguarded-recursion",
+                    f"{path} recurses without an @if@ or @for@ base case",
+                )
+
+    def _unguarded_cycle(
+        self, start: str, name: str, path: List[str]
+    ) -> Optional[List[str]]:
+        if name in path:
+            return None
+        path = [*path, name]
+        for callee, guarded, _ in self._calls.get(name, ()):
+            if guarded:
+                continue
+            if callee == start:
+                return path
+            cycle = self._unguarded_cycle(start, callee, path)
+            if cycle is not None:
+                return cycle
+        return None
+
+    def cost(self, node: ast.AST, calling: Tuple[str, ...] = ()) -> int:
+        """The estimated node visits to render `node`."""
+        if isinstance(node, ast.Block):
+            return sum(self.cost(child, calling) for child in node.nodes)
+        if isinstance(node, ast.Text):
+            return TEXT_COST
+        if isinstance(node, ast.Lookup):
+            return (
+                LOOKUP_COST
+                + node.name.count(".")
+                + TRANSFORM_COST * len(node.transforms)
+            )
+        if isinstance(node, ast.If):
+            return LOOKUP_COST + max(
+                self.cost(node.consequence, calling),
+                self.cost(node.alternative, calling),
+            )
+        if isinstance(node, ast.For):
+            return LOOKUP_COST + ASSUMED_ITERATIONS * self.cost(node.body, calling)
+        if isinstance(node, ast.Section):
+            return self.cost(node.body, calling)
+        if isinstance(node, ast.Include):
+            return INCLUDE_COST
+        if isinstance(node, ast.Call):
+            cost = CALL_COST + len(node.arguments)
+            macro = self.macros.get(node.name)
+            if macro is not None and node.name not in calling:
+                cost += self.cost(macro.body, (*calling, node.name))
+            return cost
+        return 0
+
+
+def lint_tree(
+    tree: ast.Block,
+    template: str,
+    max_cost: int = 50,
+    pure: Iterable[str] = BUILTIN_PURE_TRANSFORMS,
+) -> List[Finding]:
+    return Linter(template, max_cost, pure).lint(tree)
+
+
+def lint(
+    paths: Iterable[Union[str, Path]],
+    encoding: str = "utf8",
+    max_cost: int = 50,
+    parser_cls=Parser,
+    pure: Iterable[str] = BUILTIN_PURE_TRANSFORMS,
+) -> List[Finding]:
+    """
+    Lint the template files at `paths`. Files which fail to parse are
+    reported as `parse-error` findings.
+    """
+    findings: List[Finding] = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding=encoding) as tmpl:
+                tree = parser_cls(tmpl.read()).parse()
+        except Exception as e:
+            findings.append(
+                Finding(
+                    str(path), None, "error", "parse-error", f"{type(e).__name__}: {e}"
+                )
+            )
+            continue
+        findings.extend(lint_tree(tree, str(path), max_cost, pure))
+    return findings
@@ -0,0 +1,34 @@
+from typing import Any
+
+
+class Markup(str):
+    """
+    A string which is safe to output without escaping. Autoescaping renders
+    leave lookups producing `Markup` untouched.
+    """
+
+    __slots__ = ()
+
+
+def escape_str(value: str) -> str:
+    # a chain of replace calls beats str.translate for the short strings
+    # templates mostly deal with, as each replace is a single C level scan
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&#34;")
+        .replace("'", "&#39;")
+    )
+
+
+def escape(value: Any) -> Markup:
+    """HTML escape `value`, unless it is already `Markup`."""
+    if isinstance(value, Markup):
+        return value
+    return Markup(escape_str(value if isinstance(value, str) else str(value)))
+
+
+def safe(value: Any) -> Markup:
+    """Mark `value` as safe, so it is output as is."""
+    return Markup(value)
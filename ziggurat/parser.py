@@ -8,6 +8,10 @@ class Parser:
     def __init__(self, source: str):
         self.source = source
         self.cursor = 0
+        # line number of `_line_cursor`, advanced as nodes are parsed so
+        # counting lines stays linear in the size of the source
+        self._line = 1
+        self._line_cursor = 0
 
     @property
     def current(self) -> Optional[str]:
@@ -29,6 +33,14 @@ class Parser:
         except IndexError:
             return None
 
+    def lineno(self) -> int:
+        """The line number of the cursor."""
+        if self.cursor < self._line_cursor:
+            self._line, self._line_cursor = 1, 0
+        self._line += self.source.count("\n", self._line_cursor, self.cursor)
+        self._line_cursor = self.cursor
+        return self._line
+
     def match(self, tokens: str, after_whitespace: bool = False) -> bool:
         matched = ""
         if after_whitespace:
@@ -89,20 +101,28 @@ class Parser:
     def block(self) -> ast.Block:
         nodes: List[ast.AST] = []
         while self.current:
+            lineno = self.lineno()
+            node: ast.AST
             if self.peek_match("@if "):
-                nodes.append(self.if_stmt())
+                node = self.if_stmt()
             elif self.peek_match("@for "):
-                nodes.append(self.for_loop())
+                node = self.for_loop()
             elif self.peek_match("@include "):
-                nodes.append(self.include())
+                node = self.include()
+            elif self.peek_match("@extends "):
+                node = self.extends()
+            elif self.peek_match("@block "):
+                node = self.section()
             elif self.peek_match("@macro "):
-                nodes.append(self.macro())
+                node = self.macro()
             elif self.current == "{":
-                nodes.append(self.lookup())
+                node = self.lookup()
             elif self.current != "@":
-                nodes.append(self.text())
+                node = self.text()
             else:
                 break
+            node.lineno = lineno
+            nodes.append(node)
         return ast.Block(nodes)
 
     def if_stmt(self) -> ast.If:
@@ -159,6 +179,36 @@ class Parser:
         self.match("@", after_whitespace=True)
         return ast.Include(word)
 
+    def extends(self) -> ast.Extends:
+        """
+        @extends base.txt@
+
+        the template's `@block name@` sections replace those of the same name
+        in base.txt, anything outside of them (except macros) is ignored.
+        """
+        self.match("@extends ")
+        word = self.word()
+        self.match("@", after_whitespace=True)
+        self.maybe_eat_newline()
+        return ast.Extends(word)
+
+    def section(self) -> ast.Section:
+        """
+        @block name@
+            overridable content
+        @endblock@
+        """
+        self.match("@block ")
+        name = self.word()
+        self.match("@", after_whitespace=True)
+        self.maybe_eat_newline()
+
+        body = self.block()
+        self.match("@endblock@")
+        self.maybe_eat_newline()
+
+        return ast.Section(name, body)
+
     def macro(self) -> ast.Macro:
         """
         @macro name(param1, param2)@
@@ -192,7 +242,7 @@ class Parser:
 
     def lookup(self) -> Union[ast.Lookup, ast.Call]:
         """
-        {variable | optional_transform}
+        {variable ? "optional default" | optional_transform}
         """
         self.match("{")
         self.eat_whitespace()
@@ -203,6 +253,15 @@ class Parser:
         word = self.word()
         self.eat_whitespace()
 
+        default = None
+        if self.current == "?":
+            self.next()
+            self.eat_whitespace()
+            if self.current is None or self.current not in "\"'":
+                raise Exception(f"Expected a string literal default for {word}")
+            default = self.string_literal()
+            self.eat_whitespace()
+
         transforms = []
         while self.current == "|":
             self.next()
@@ -212,7 +271,7 @@ class Parser:
 
         self.match("}")
 
-        return ast.Lookup(word, transforms)
+        return ast.Lookup(word, transforms, default)
 
     def call_macro(self) -> ast.Call:
         self.match("!")
@@ -0,0 +1,128 @@
+"""
+Measuring how much of the memory holding parsed templates is shared with
+other processes, e.g. the workers forked from a master process which loaded
+and froze them, see `Environment.freeze`.
+"""
+
+import mmap
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ziggurat import ast
+from ziggurat.template import Template
+
+PAGE_SIZE = mmap.PAGESIZE
+
+# the objects making up a tree, anything else (like transform functions) is
+# shared by the module defining it
+_TREE_TYPES = (ast.AST, dict, list, tuple, str)
+
+_PRESENT = 1 << 63
+_EXCLUSIVE = 1 << 56
+
+
+class SharingReport:
+    """
+    The pages of memory holding the trees of a set of templates, split into
+    those shared with another process and those private to this one. Pages
+    which aren't resident are neither. `shared_pages` and `private_pages` are
+    None where `/proc/self/pagemap` can't be read, i.e. outside of Linux.
+
+    `process` holds the process wide totals of `/proc/self/smaps_rollup`, in
+    bytes, where available.
+    """
+
+    def __init__(self, objects: int, pages: int):
+        self.objects = objects
+        self.pages = pages
+        self.shared_pages: Optional[int] = None
+        self.private_pages: Optional[int] = None
+        self.process: Dict[str, int] = {}
+
+    @property
+    def shared(self) -> Optional[int]:
+        """Bytes of shared pages."""
+        return None if self.shared_pages is None else self.shared_pages * PAGE_SIZE
+
+    @property
+    def private(self) -> Optional[int]:
+        """Bytes of private pages."""
+        return None if self.private_pages is None else self.private_pages * PAGE_SIZE
+
+    def summary(self) -> str:
+        if self.shared is None or self.private is None:
+            return f"{self.objects} objects on {self.pages} pages, sharing unknown"
+        return (
+            f"{self.objects} objects on {self.pages} pages: "
+            f"{self.shared // 1024}KiB shared, {self.private // 1024}KiB private"
+        )
+
+
+def tree_objects(templates: Iterable[Template]) -> List[object]:
+    """Every object of the templates' trees, each once."""
+    seen: Set[int] = set()
+    objects: List[object] = []
+    stack: List[object] = [template.ast for template in templates]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        objects.append(obj)
+
+        if isinstance(obj, ast.AST):
+            stack.append(obj.__dict__)
+        elif isinstance(obj, dict):
+            stack.extend(o for o in obj.values() if isinstance(o, _TREE_TYPES))
+            stack.extend(o for o in obj if isinstance(o, str))
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(o for o in obj if isinstance(o, _TREE_TYPES))
+    return objects
+
+
+def tree_pages(templates: Iterable[Template]) -> Tuple[int, List[int]]:
+    """The number of objects of the templates' trees and the pages they're on."""
+    objects = tree_objects(templates)
+    pages: Set[int] = set()
+    for obj in objects:
+        # CPython's id is the object's address
+        start = id(obj)
+        end = start + sys.getsizeof(obj) - 1
+        pages.update(range(start // PAGE_SIZE, end // PAGE_SIZE + 1))
+    return len(objects), sorted(pages)
+
+
+def sharing_report(objects: int, pages: List[int]) -> SharingReport:
+    """
+    Check which of `pages` are shared. Walking the objects to find their pages
+    writes to their reference counts, which in a forked process copies the
+    pages, so `tree_pages` should be run before forking.
+    """
+    report = SharingReport(objects, len(pages))
+    try:
+        with open("/proc/self/pagemap", "rb") as pagemap:
+            shared = private = 0
+            for page in pages:
+                pagemap.seek(page * 8)
+                (entry,) = struct.unpack("<Q", pagemap.read(8))
+                if not entry & _PRESENT:
+                    continue
+                if entry & _EXCLUSIVE:
+                    private += 1
+                else:
+                    shared += 1
+        report.shared_pages, report.private_pages = shared, private
+    except (OSError, struct.error):
+        pass
+
+    try:
+        with open("/proc/self/smaps_rollup", "r") as rollup:
+            for line in rollup:
+                key, _, value = line.partition(":")
+                fields = value.split()
+                if len(fields) == 2 and fields[1] == "kB":
+                    report.process[key] = int(fields[0]) * 1024
+    except OSError:
+        pass
+    return report
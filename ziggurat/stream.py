@@ -0,0 +1,52 @@
+"""
+Streaming renders, writing the output of loops out as they go rather than
+holding all of it until the render ends.
+"""
+
+from typing import Any, Callable, List, Optional
+
+
+class Flusher:
+    """
+    Writes the pieces of output collected in `sink` to `write` (and empties
+    it) after every `every` loop iterations, or once `size` characters are
+    waiting, whichever comes first. `written` counts the characters written.
+    """
+
+    def __init__(
+        self,
+        sink: List[str],
+        write: Callable[[str], Any],
+        every: Optional[int] = None,
+        size: Optional[int] = None,
+    ):
+        self.sink = sink
+        self.write = write
+        self.every = every
+        self.size = size
+        self.written = 0
+        self.iterations = 0
+        # characters in the sink, counted up to `_counted` pieces
+        self._pending = 0
+        self._counted = 0
+
+    def iterated(self):
+        """Called after every loop iteration, flushes if it's time to."""
+        self.iterations += 1
+        if self.every is not None and self.iterations % self.every == 0:
+            self.flush()
+        elif self.size is not None:
+            sink = self.sink
+            for i in range(self._counted, len(sink)):
+                self._pending += len(sink[i])
+            self._counted = len(sink)
+            if self._pending >= self.size:
+                self.flush()
+
+    def flush(self):
+        if self.sink:
+            chunk = "".join(self.sink)
+            self.sink.clear()
+            self.write(chunk)
+            self.written += len(chunk)
+        self._pending = self._counted = 0
@@ -1,16 +1,23 @@
+import threading
+import time
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Type
+from typing import Any, Callable, Dict, List, Mapping, Optional, Type
 
+from ziggurat import ast
+from ziggurat.analysis import ContextPaths
+from ziggurat.cache import Uncacheable, fingerprint
+from ziggurat.environment import Environment, default_environment
+from ziggurat.incremental import IncrementalRender
+from ziggurat.inheritance import extend
+from ziggurat.limits import Budget, RenderLimits
 from ziggurat.parser import Parser
-from ziggurat.visitor import Renderer
+from ziggurat.stream import Flusher
+from ziggurat.visitor import Binder, Renderer
 
 
 class Template:
-    transforms: Dict[str, Callable[[Any], Any]] = {
-        "upper": str.upper,
-        "lower": str.lower,
-        "capitalize": str.capitalize,
-    }
+    # the default environment's registry, mutated by `register_transform`
+    transforms: Dict[str, Callable[[Any], Any]] = default_environment.transforms
 
     def __init__(
         self,
@@ -18,20 +25,217 @@ class Template:
         encoding: str = "utf8",
         parser_cls: Type[Parser] = Parser,
         renderer_cls: Type[Renderer] = Renderer,
+        environment: Optional[Environment] = None,
+        autoescape: Optional[bool] = None,
+        tree: Optional[ast.Block] = None,
     ):
+        """
+        Load the template at `source`. Pass the already parsed `tree` of the
+        file to skip reading and parsing it.
+        """
+        start = time.perf_counter()
         self.source = Path(source)
         self.renderer_cls = renderer_cls
-        with open(source, "r", encoding=encoding) as tmpl:
-            self.ast = parser_cls(tmpl.read()).parse()
+        self.environment = environment or default_environment
+        if autoescape is None:
+            autoescape = self.environment.autoescape
+        self.autoescape = autoescape
+        if tree is None:
+            with open(source, "r", encoding=encoding) as tmpl:
+                tree = parser_cls(tmpl.read()).parse()
+        self.ast = extend(tree, self.load_parent)
+        self.bind()
+        self._context_paths: Optional[List[str]] = None
+        self._analyzed = False
+        # seconds taken to read, parse and bind the template (and load the
+        # templates it @extends@)
+        self.load_seconds = time.perf_counter() - start
+        # renders run (as an include too) and renders served by the render
+        # cache, see `Environment.stats`. Counted under a lock as templates
+        # are rendered from many threads at once.
+        self.renders = 0
+        self.cache_hits = 0
+        self._counts = threading.Lock()
 
-    def render(self, ctx: Dict[str, Any]) -> str:
-        renderer = self.renderer_cls(ctx, self.transforms, self.source.parent)
-        self.ast.accept(renderer)
-        return renderer.result
+    def load_parent(self, source: str) -> "Template":
+        return self.environment.get_template(self.source.parent / source)
 
+    def bind(self):
+        """
+        Resolve the transforms used by the template against the environment's
+        registry. Raises `UnknownTransformError` for any name not registered.
+        """
+        transforms = self.environment.transforms
+        Binder(transforms, str(self.source)).bind(self.ast)
+        self._bound_version = transforms.version
 
-def register_transform(func: Callable[[Any], Any], name: Optional[str] = None):
-    if name is None:
-        name = func.__name__
-    Template.transforms[name] = func
-    return func
+    def render(
+        self, ctx: Mapping[str, Any], limits: Optional[RenderLimits] = None
+    ) -> str:
+        """
+        Render the template with `ctx`. `limits` overrides the environment's
+        render limits for this render.
+        """
+        if limits is None:
+            limits = self.environment.limits
+        budget = Budget(limits) if limits is not None else None
+
+        cache = self.environment.render_cache
+        if cache is not None:
+            key = self.cache_key(ctx)
+            if key is not None:
+                result = cache.get(key)
+                if result is None:
+                    result = self._render(ctx, budget)
+                    cache.set(key, result)
+                else:
+                    with self._counts:
+                        self.cache_hits += 1
+                return result
+
+        return self._render(ctx, budget)
+
+    def incremental(
+        self, ctx: Mapping[str, Any], encoding: str = "utf8"
+    ) -> IncrementalRender:
+        """
+        Render the template with `ctx`, returning a handle which re-renders
+        only the parts affected by later changes to the context.
+        """
+        return IncrementalRender(self, ctx, encoding)
+
+    def context_paths(self) -> Optional[List[str]]:
+        """
+        The context paths the template reads, through its includes and macro
+        calls too, or None if they can't all be known.
+        """
+        if not self._analyzed:
+            collector = ContextPaths(self.environment.get_template, self.source.parent)
+            self.ast.accept(collector)
+            self._context_paths = collector.minimal() if collector.complete else None
+            self._analyzed = True
+        return self._context_paths
+
+    def cache_key(self, ctx: Mapping[str, Any]) -> Optional[str]:
+        """
+        The render cache key for rendering `ctx`, or None if the render can't
+        be cached.
+        """
+        paths = self.context_paths()
+        if paths is None:
+            return None
+        try:
+            digest = fingerprint(ctx, paths)
+        except Uncacheable:
+            return None
+        environment = self.environment
+        namespace = environment.cache_namespace()
+        version = environment.transforms.version
+        return f"{self.source}:{namespace}:{version}:{int(self.autoescape)}:{digest}"
+
+    def renderer(
+        self,
+        ctx: Mapping[str, Any],
+        budget: Optional[Budget] = None,
+        sink: Optional[List[str]] = None,
+        flusher: Optional[Flusher] = None,
+        autoescape: Optional[bool] = None,
+    ) -> Renderer:
+        """
+        A renderer set up to render the template's tree, or parts of it.
+        `autoescape` overrides the template's own setting.
+        """
+        transforms = self.environment.transforms
+        if self._bound_version != transforms.version:
+            self.bind()
+
+        return self.renderer_cls(
+            ctx,
+            transforms,
+            self.source.parent,
+            environment=self.environment,
+            name=str(self.source),
+            autoescape=self.autoescape if autoescape is None else autoescape,
+            budget=budget,
+            sink=sink,
+            flusher=flusher,
+        )
+
+    def _render(self, ctx: Mapping[str, Any], budget: Optional[Budget]) -> str:
+        return "".join(self.render_into(ctx, [], budget))
+
+    def stream(
+        self,
+        ctx: Mapping[str, Any],
+        write: Callable[[str], Any],
+        flush_every: Optional[int] = None,
+        flush_size: Optional[int] = 65536,
+        limits: Optional[RenderLimits] = None,
+    ) -> int:
+        """
+        Render the template with `ctx`, passing the output to `write` in
+        chunks as it's rendered rather than returning it. Output is flushed
+        after every `flush_every` iterations of any loop, or once
+        `flush_size` characters are waiting, and at the end. Loops pull from
+        their iterables lazily, so rendering a loop over a cursor or
+        generator only holds a chunk of output at a time. Renders are never
+        cached. Returns the number of characters written.
+        """
+        if limits is None:
+            limits = self.environment.limits
+        budget = Budget(limits) if limits is not None else None
+
+        sink: List[str] = []
+        flusher = Flusher(sink, write, flush_every, flush_size)
+        self.render_into(ctx, sink, budget, flusher)
+        flusher.flush()
+        return flusher.written
+
+    def render_into(
+        self,
+        ctx: Mapping[str, Any],
+        sink: List[str],
+        budget: Optional[Budget] = None,
+        flusher: Optional[Flusher] = None,
+        autoescape: Optional[bool] = None,
+    ) -> List[str]:
+        """
+        Render the template with `ctx`, appending the pieces of output to
+        `sink`, which is returned. Macro calls and includes write to the same
+        sink, so however deeply they nest the output is only copied when the
+        caller finally joins it. `autoescape` overrides the template's own
+        setting, so includes are escaped like the template including them.
+        """
+        with self._counts:
+            self.renders += 1
+        renderer = self.renderer(ctx, budget, sink, flusher, autoescape)
+        instrumentation = self.environment.instrumentation
+        if instrumentation is None:
+            self.ast.accept(renderer)
+            return sink
+
+        instrumentation.render_start(renderer.name)
+        start, mark = time.perf_counter(), len(sink)
+        # what was written out (and so emptied from the sink) while streaming
+        # counts as output too
+        before = flusher.written + sum(map(len, sink)) if flusher else 0
+        try:
+            self.ast.accept(renderer)
+        except Exception as e:
+            instrumentation.render_end(renderer.name, time.perf_counter() - start, 0, e)
+            raise
+        if flusher is not None:
+            size = flusher.written + sum(map(len, sink)) - before
+        else:
+            size = sum(map(len, sink[mark:]))
+        instrumentation.render_end(renderer.name, time.perf_counter() - start, size)
+        return sink
+
+
+def register_transform(
+    func: Callable[[Any], Any],
+    name: Optional[str] = None,
+    safe: bool = False,
+    pure: bool = False,
+):
+    return default_environment.register_transform(func, name, safe, pure)
@@ -0,0 +1,49 @@
+"""
+Policies for rendering names missing from the context.
+"""
+
+from typing import Any, Mapping, Tuple, Union
+
+# raise `UndefinedError`, the default
+STRICT = "strict"
+# render missing names as an empty string
+EMPTY = "empty"
+
+# returned by lookups of missing names, so they never need to raise
+UNDEFINED: Any = object()
+
+
+def get_item(mapping: Mapping[str, Any], key: str) -> Any:
+    """
+    `mapping[key]`, or `UNDEFINED` if it's missing. Looked up with `get` so a
+    missing key doesn't raise, except for dicts defining `__missing__` (like
+    `defaultdict`), which `get` would skip.
+    """
+    value = mapping.get(key, UNDEFINED)
+    if value is UNDEFINED and hasattr(type(mapping), "__missing__"):
+        try:
+            value = mapping[key]
+        except KeyError:
+            pass
+    return value
+
+
+class Default:
+    """Render missing names as `value`."""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+Policy = Union[str, Default]
+
+
+def parse_policy(policy: Policy) -> Tuple[bool, Any]:
+    """Whether `policy` is strict, and the value missing names render as."""
+    if isinstance(policy, Default):
+        return False, policy.value
+    if policy == STRICT:
+        return True, None
+    if policy == EMPTY:
+        return False, ""
+    raise ValueError(f"Unknown undefined policy {policy!r}")
@@ -1,9 +1,18 @@
 from abc import ABC, abstractmethod
+from collections import ChainMap
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from ziggurat import ast
+from ziggurat.exceptions import TemplateError, UndefinedError, UnknownTransformError
+from ziggurat.limits import Budget
+from ziggurat.markup import Markup, escape_str
+from ziggurat.stream import Flusher
+from ziggurat.undefined import STRICT, UNDEFINED, get_item, parse_policy
+
+if TYPE_CHECKING:
+    from ziggurat.environment import Environment
 
 
 class Visitor(ABC):
@@ -31,6 +40,14 @@ class Visitor(ABC):
     def visit_include(self, node: ast.Include):
         ...
 
+    @abstractmethod
+    def visit_extends(self, node: ast.Extends):
+        ...
+
+    @abstractmethod
+    def visit_section(self, node: ast.Section):
+        ...
+
     @abstractmethod
     def visit_macro(self, node: ast.Macro):
         ...
@@ -46,38 +63,106 @@ MacroDict = Dict[str, Tuple[List[str], ast.Block]]
 class Renderer(Visitor):
     def __init__(
         self,
-        context: Dict[str, Any],
+        context: Mapping[str, Any],
         transforms: Dict[str, Callable],
         base: Optional[Path] = None,
+        environment: Optional["Environment"] = None,
+        name: Optional[str] = None,
+        autoescape: bool = False,
+        budget: Optional[Budget] = None,
+        sink: Optional[List[str]] = None,
+        flusher: Optional[Flusher] = None,
     ):
+        # the user's context is never written to. Loops push their own scopes
+        # on top of it, so a context (and template) can be shared by any number
+        # of concurrent renders.
         self.context = context
+        self.scopes: List[Mapping[str, Any]] = [context]
+        # per loop being rendered, the values of hoisted nodes evaluated since
+        # the loop was entered, see `Binder`
+        self.hoisted: List[Dict[ast.AST, Any]] = []
         self.transforms = transforms
         self.base = base
-        self.include_cache: Dict[str, str] = {}
+        self.environment = environment
+        self.name = name or "<template>"
+        self.autoescape = autoescape
+        # usage of the render's limits, None if unlimited
+        self.budget = budget
+        self.instrumentation = environment.instrumentation if environment else None
+        # how missing names render, see `ziggurat.undefined`
+        self.strict, self.undefined_value = parse_policy(
+            environment.undefined if environment else STRICT
+        )
+        # the pieces of output of each include, by source
+        self.include_cache: Dict[str, List[str]] = {}
         self.macros: MacroDict = {}
-        self._result: List[str] = []
+        # output is appended here, shared with the renderers of macro calls
+        # and includes so nothing is copied until the final join
+        self._result: List[str] = [] if sink is None else sink
+        # empties the sink as loops go when streaming, see `Template.stream`.
+        # Includes render without one, their output is captured for reuse.
+        self.flusher = flusher
 
     @property
     def result(self):
         return "".join(self._result)
 
+    @property
+    def scope(self) -> Mapping[str, Any]:
+        """The user's context with any loop scopes layered over it."""
+        if len(self.scopes) == 1:
+            return self.context
+        return ChainMap(*reversed(self.scopes))  # type: ignore[arg-type]
+
+    def lookup(self, name: str) -> Any:
+        """
+        The value of the dotted path `name`, or `UNDEFINED` if it's missing.
+        Missing names are found without raising, so they cost no more than
+        present ones.
+        """
+        parts = name.split(".")
+
+        for scope in reversed(self.scopes):
+            ctx = get_item(scope, parts[0])
+            if ctx is not UNDEFINED:
+                break
+        else:
+            return UNDEFINED
+
+        for part in parts[1:]:
+            if isinstance(ctx, dict):
+                ctx = get_item(ctx, part)
+            else:
+                ctx = getattr(ctx, part, UNDEFINED)
+            if ctx is UNDEFINED:
+                break
+        return ctx
+
+    def resolve(self, name: str, node: Optional[ast.AST] = None) -> Any:
+        """The value of `name`, or what the undefined policy makes of it."""
+        value = self.lookup(name)
+        if value is UNDEFINED:
+            return self.undefined(name, node)
+        return value
+
+    def undefined(self, name: str, node: Optional[ast.AST] = None) -> Any:
+        if self.strict:
+            raise UndefinedError(name, self.name, node.lineno if node else None)
+        return self.undefined_value
+
     def visit_block(self, node: ast.Block):
         for child_node in node.nodes:
             child_node.accept(self)
 
     def visit_if(self, node: ast.If):
-        parts = node.condition.split(".")
-
-        if len(parts) == 1:
-            value = self.context[node.condition]
+        hoist = node.hoist
+        if hoist is not None and hoist < len(self.hoisted):
+            hoisted = self.hoisted[hoist]
+            value = hoisted.get(node, UNDEFINED)
+            if value is UNDEFINED:
+                value = hoisted[node] = bool(self.resolve(node.condition, node))
         else:
-            ctx = self.context
-            for part in parts:
-                if isinstance(ctx, dict):
-                    ctx = ctx[part]
-                else:
-                    ctx = getattr(ctx, part)
-            value = ctx
+            value = self.resolve(node.condition, node)
 
         if value:
             node.consequence.accept(self)
@@ -85,63 +170,127 @@ class Renderer(Visitor):
             node.alternative.accept(self)
 
     def visit_for(self, node: ast.For):
-        iterator = self.context[node.iterator]
-        previous = self.context.get(node.name)
-
-        for i in iterator:
-            self.context[node.name] = i
-            node.body.accept(self)
+        iterator = self.lookup(node.iterator)
+        if iterator is UNDEFINED:
+            # a missing iterator is an empty loop, unless the policy is strict
+            self.undefined(node.iterator, node)
+            return
 
-        if previous:
-            self.context[node.name] = previous
-        elif node.name in self.context:
-            del self.context[node.name]
+        scope: Dict[str, Any] = {}
+        budget = self.budget
+        flusher = self.flusher
+
+        self.scopes.append(scope)
+        self.hoisted.append({})
+        try:
+            for i in iterator:
+                if budget is not None:
+                    budget.iterate(self.name, node)
+                scope[node.name] = i
+                node.body.accept(self)
+                if flusher is not None:
+                    flusher.iterated()
+        finally:
+            self.scopes.pop()
+            self.hoisted.pop()
 
     def visit_include(self, node: ast.Include):
-        from ziggurat.template import Template
+        if self.instrumentation is not None:
+            self.instrumentation.include(self.name, node.source)
 
         cached_result = self.include_cache.get(node.source)
         if cached_result:
-            self._result.append(cached_result)
+            if self.budget is not None:
+                self.budget.write(sum(map(len, cached_result)), self.name, node)
+            self._result.extend(cached_result)
             return
 
         if self.base is None:
             raise ValueError("You must provide a base path when using @include file@")
-        template = Template(str(self.base / node.source))
-        result = template.render(self.context)
-        self.include_cache[node.source] = result
-        self._result.append(result)
+        environment = self.environment
+        if environment is None:
+            from ziggurat.environment import default_environment
+
+            environment = default_environment
+        template = environment.get_template(self.base / node.source)
+        start = len(self._result)
+        # escaped as the including template is, whatever the included
+        # template's own setting
+        if self.budget is None:
+            template.render_into(self.scope, self._result, autoescape=self.autoescape)
+        else:
+            self.budget.enter_include(self.name, node)
+            try:
+                template.render_into(
+                    self.scope, self._result, self.budget, autoescape=self.autoescape
+                )
+            finally:
+                self.budget.exit_include()
+        self.include_cache[node.source] = self._result[start:]
+
+    def visit_extends(self, node: ast.Extends):
+        raise TemplateError(
+            f"@extends {node.source}@ must be resolved when the template is loaded"
+        )
+
+    def visit_section(self, node: ast.Section):
+        node.body.accept(self)
 
     def visit_macro(self, node: ast.Macro):
         self.macros[node.name] = (node.parameters, node.body)
 
     def visit_text(self, node: ast.Text):
+        if self.budget is not None:
+            self.budget.write(len(node.text), self.name, node)
         self._result.append(node.text)
 
     def visit_lookup(self, node: ast.Lookup):
-        parts = node.name.split(".")
-
-        if len(parts) == 1:
-            value = self.context[node.name]
+        hoist = node.hoist
+        if hoist is not None and hoist < len(self.hoisted):
+            # evaluated once per entry to the loop, however many iterations
+            hoisted = self.hoisted[hoist]
+            value = hoisted.get(node)
+            if value is None:
+                value = hoisted[node] = self.evaluate(node)
         else:
-            ctx = self.context
-            for part in parts:
-                if isinstance(ctx, dict):
-                    ctx = ctx[part]
-                else:
-                    ctx = getattr(ctx, part)
-            value = ctx
+            value = self.evaluate(node)
 
-        for transform in node.transforms:
-            func = self.transforms[transform]
+        if self.budget is not None:
+            self.budget.write(len(value), self.name, node)
+        self._result.append(value)
+
+    def evaluate(self, node: ast.Lookup) -> str:
+        """The output of a lookup node."""
+        value = self.lookup(node.name)
+        if value is UNDEFINED:
+            if node.default is not None:
+                value = node.default
+            else:
+                value = self.undefined(node.name, node)
+
+        funcs, safe = node.funcs, node.safe
+        if funcs is None:
+            # an unbound node, resolve the transforms by name
+            funcs = tuple(self.transforms[transform] for transform in node.transforms)
+            safe = bool(node.transforms) and node.transforms[-1] in getattr(
+                self.transforms, "safe", ()
+            )
+        for func in funcs:
             value = func(value)
+        if self.instrumentation is not None:
+            for transform in node.transforms:
+                self.instrumentation.transform(self.name, transform)
 
         if not isinstance(value, str):
             value = str(value)
-
-        self._result.append(value)
+        if self.autoescape and not safe and not isinstance(value, Markup):
+            value = escape_str(value)
+        return value
 
     def visit_call(self, node: ast.Call):
+        if self.instrumentation is not None:
+            self.instrumentation.macro(self.name, node.name)
+
         params, macro = self.macros[node.name]
         # macros run in a sub renderer with their own context which is the
         # paramater->arg mapping
@@ -149,14 +298,163 @@ class Renderer(Visitor):
         for param in params:
             arg = node.arguments[param]
             if isinstance(arg, ast.Lookup):
-                arg = self.context[arg.name]
+                arg = self.resolve(arg.name, node)
             ctx[param] = arg
 
-        renderer = Renderer(context=ctx, transforms=self.transforms, base=self.base)
+        renderer = Renderer(
+            context=ctx,
+            transforms=self.transforms,
+            base=self.base,
+            environment=self.environment,
+            name=self.name,
+            autoescape=self.autoescape,
+            budget=self.budget,
+            sink=self._result,
+            flusher=self.flusher,
+        )
         renderer.include_cache = self.include_cache
         renderer.macros = self.macros  # allows recursive macro calls
-        macro.accept(renderer)
-        self._result.append(renderer.result)
+        if self.budget is None:
+            macro.accept(renderer)
+        else:
+            self.budget.enter_macro(self.name, node)
+            try:
+                macro.accept(renderer)
+            finally:
+                self.budget.exit_macro()
+
+
+class NodeVisitor(Visitor):
+    """
+    Visits every node of a tree, including the lookups passed as macro
+    arguments. Subclasses override the methods for the nodes they care about.
+    """
+
+    def visit_block(self, node: ast.Block):
+        for child_node in node.nodes:
+            child_node.accept(self)
+
+    def visit_if(self, node: ast.If):
+        node.consequence.accept(self)
+        node.alternative.accept(self)
+
+    def visit_for(self, node: ast.For):
+        node.body.accept(self)
+
+    def visit_include(self, node: ast.Include):
+        pass
+
+    def visit_extends(self, node: ast.Extends):
+        pass
+
+    def visit_section(self, node: ast.Section):
+        node.body.accept(self)
+
+    def visit_macro(self, node: ast.Macro):
+        node.body.accept(self)
+
+    def visit_text(self, node: ast.Text):
+        pass
+
+    def visit_lookup(self, node: ast.Lookup):
+        pass
+
+    def visit_call(self, node: ast.Call):
+        for arg in node.arguments.values():
+            if isinstance(arg, ast.Lookup):
+                arg.accept(self)
+
+
+class Binder(NodeVisitor):
+    """
+    Resolves the transforms used by every lookup to their functions, so the
+    renderer doesn't look them up by name on each evaluation. All unknown
+    transform names are collected and reported together.
+
+    Lookups (with only pure transforms) and conditions in loop bodies which
+    don't depend on the loops' names are marked to be hoisted out of them.
+
+    Nothing is written to the tree unless every name resolves, so a failed
+    rebind leaves a tree being rendered concurrently as it was.
+    """
+
+    def __init__(self, transforms: Dict[str, Callable], template: Optional[str] = None):
+        self.transforms = transforms
+        self.safe = getattr(transforms, "safe", ())
+        self.pure = getattr(transforms, "pure", ())
+        self.template = template
+        self.unknown: List[str] = []
+        # the names bound by the loops around the node being visited
+        self._loops: List[str] = []
+        # (node, attribute, value) to set once the whole tree is resolved
+        self._bindings: List[Tuple[ast.AST, str, Any]] = []
+
+    def bind(self, node: ast.AST):
+        node.accept(self)
+        if self.unknown:
+            raise UnknownTransformError(self.unknown, self.template)
+        for bound, attr, value in self._bindings:
+            setattr(bound, attr, value)
+
+    def hoist(self, name: str) -> Optional[int]:
+        head = name.split(".", 1)[0]
+        # one past the innermost loop binding the name, the loops from there
+        # on don't change its value
+        level = 0
+        for i in range(len(self._loops) - 1, -1, -1):
+            if self._loops[i] == head:
+                level = i + 1
+                break
+        return level if level < len(self._loops) else None
+
+    def visit_if(self, node: ast.If):
+        self._bindings.append((node, "hoist", self.hoist(node.condition)))
+        super().visit_if(node)
+
+    def visit_for(self, node: ast.For):
+        self._loops.append(node.name)
+        try:
+            super().visit_for(node)
+        finally:
+            self._loops.pop()
+
+    def visit_macro(self, node: ast.Macro):
+        # macro bodies render in their own renderer, outside of any loop
+        loops, self._loops = self._loops, []
+        try:
+            super().visit_macro(node)
+        finally:
+            self._loops = loops
+
+    def visit_lookup(self, node: ast.Lookup):
+        funcs = []
+        for transform in node.transforms:
+            func = self.transforms.get(transform)
+            if func is None:
+                self.unknown.append(transform)
+            else:
+                funcs.append(func)
+        safe = bool(node.transforms) and node.transforms[-1] in self.safe
+        hoist = None
+        if all(transform in self.pure for transform in node.transforms):
+            hoist = self.hoist(node.name)
+        self._bindings.extend(
+            [
+                (node, "funcs", tuple(funcs)),
+                (node, "safe", safe),
+                (node, "hoist", hoist),
+            ]
+        )
+
+
+class IncludeCollector(NodeVisitor):
+    """Collects every `@include@` of a tree."""
+
+    def __init__(self):
+        self.includes: List[ast.Include] = []
+
+    def visit_include(self, node: ast.Include):
+        self.includes.append(node)
 
 
 class Display(Visitor):
@@ -203,6 +501,16 @@ class Display(Visitor):
     def visit_include(self, node: ast.Include):
         self.write(f"Include({node.source})")
 
+    def visit_extends(self, node: ast.Extends):
+        self.write(f"Extends({node.source})")
+
+    def visit_section(self, node: ast.Section):
+        self.write("Section(")
+        with self.inc_depth():
+            self.write(f"name={node.name}")
+            node.body.accept(self)
+        self.write(")")
+
     def visit_macro(self, node: ast.Macro):
         self.write("Macro(")
         with self.inc_depth():
@@ -212,10 +520,11 @@ class Display(Visitor):
         self.write(")")
 
     def visit_lookup(self, node: ast.Lookup):
+        default = f" default={node.default!r}" if node.default is not None else ""
         if node.transforms:
-            self.write(f"Lookup({node.name} transforms={node.transforms})")
+            self.write(f"Lookup({node.name} transforms={node.transforms}{default})")
         else:
-            self.write(f"Lookup({node.name})")
+            self.write(f"Lookup({node.name}{default})")
 
     def visit_call(self, node: ast.Call):
         self.write("Call(")